@@ -0,0 +1,144 @@
+# Пакетное доказательство: независимые задачи (списки клауз), каждая в отдельном процессе.
+# Модуль общий для обоих пруверов: используется res, найденный первым в sys.path.
+import multiprocessing
+import os
+import time
+from dataclasses import replace
+from multiprocessing.connection import wait
+
+from res import LIMIT_REACHED, STRATEGIES, Budget, ProofResult, prove
+
+ERROR = "error"  # задача завершилась исключением (текст - ProofResult.reason)
+
+# запас сверх таймаута до принудительной остановки процесса, секунды
+TIMEOUT_GRACE = 1.0
+
+
+def prove_task(clauses, budget, strategy="shortest"):
+    # задача процесса: доказательство без вывода
+    return prove(clauses, 0, budget, strategy)
+
+
+def task_budget(budget, timeout):
+    # ограничения задачи: таймаут становится лимитом времени поиска
+    if budget is None:
+        budget = Budget()
+    if timeout is not None and (budget.time is None or budget.time > timeout):
+        budget = replace(budget, time=timeout)
+    return budget
+
+
+def run_task(connection, clauses, budget, strategy):
+    # процесс задачи: результат (или исключение как ERROR) - в канал
+    try:
+        result = prove_task(clauses, budget, strategy)
+    except Exception as error:
+        result = ProofResult(ERROR, reason=repr(error))
+    connection.send(result)
+    connection.close()
+
+
+def start_task(clauses, budget, strategy="shortest"):
+    # запуск задачи в своем процессе; возвращает (процесс, канал результата)
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=run_task, args=(sender, clauses, budget, strategy),
+                                      daemon=True)
+    process.start()
+    sender.close()  # иначе конец канала не наступит при падении процесса
+    return process, receiver
+
+
+def task_result(process, receiver):
+    # результат задачи, канал которой готов к чтению
+    # процесс упал, не ответив (например, нехватка памяти) - ERROR
+    try:
+        result = receiver.recv()
+    except EOFError:
+        process.join()
+        result = ProofResult(ERROR, reason=f"process exited with code {process.exitcode}")
+    else:
+        process.join()
+    receiver.close()
+    return result
+
+
+def stop_task(process, receiver):
+    # принудительная остановка одной задачи
+    process.terminate()
+    process.join()
+    receiver.close()
+
+
+def prove_batch(problems, workers=None, timeout=None, budget=None):
+    # problems - итерируемое задач, читается по мере освобождения процессов
+    # выдает (номер задачи, ProofResult) в порядке завершения
+    # timeout - секунды на задачу: поиск останавливается сам по Budget.time,
+    # а процесс, не ответивший за timeout + TIMEOUT_GRACE, останавливается один,
+    # остальные задачи продолжают решаться
+    workers = workers or os.cpu_count() or 1
+    budget = task_budget(budget, timeout)
+    problems = enumerate(problems)
+    running = {}  # канал -> (номер, процесс, время запуска)
+    try:
+        while True:
+            # задач не больше, чем workers: время запуска - начало решения
+            while len(running) < workers:
+                task = next(problems, None)
+                if task is None:
+                    break
+                number, clauses = task
+                process, receiver = start_task(clauses, budget)
+                running[receiver] = (number, process, time.monotonic())
+            if not running:
+                break
+
+            wait_time = None
+            if timeout is not None:
+                oldest = min(started for _, _, started in running.values())
+                wait_time = max(0.0, oldest + timeout + TIMEOUT_GRACE - time.monotonic())
+            for receiver in wait(list(running), wait_time):
+                number, process, _ = running.pop(receiver)
+                yield number, task_result(process, receiver)
+
+            # зависшие задачи - результат по лимиту времени
+            now = time.monotonic()
+            for receiver, (number, process, started) in list(running.items()):
+                if timeout is not None and now - started > timeout + TIMEOUT_GRACE:
+                    del running[receiver]
+                    stop_task(process, receiver)
+                    yield number, ProofResult(LIMIT_REACHED, reason="time")
+    finally:
+        for receiver, (_, process, _) in running.items():
+            stop_task(process, receiver)
+
+
+def prove_portfolio(clauses, strategies=None, timeout=None, budget=None):
+    # одна задача разными стратегиями в отдельных процессах (гонка)
+    # возвращает (стратегия, ProofResult): первое доказательство, остальные процессы останавливаются;
+    # без доказательства - результат первой из стратегий
+    strategies = list(strategies or STRATEGIES)
+    budget = task_budget(budget, timeout)
+    results = {}
+    running = {}  # канал -> (стратегия, процесс)
+    try:
+        for strategy in strategies:
+            process, receiver = start_task(clauses, budget, strategy)
+            running[receiver] = (strategy, process)
+        deadline = None if timeout is None else time.monotonic() + timeout + TIMEOUT_GRACE
+        while running:
+            wait_time = None if deadline is None else max(0.0, deadline - time.monotonic())
+            ready = wait(list(running), wait_time)
+            if not ready:
+                break
+            for receiver in ready:
+                strategy, process = running.pop(receiver)
+                result = task_result(process, receiver)
+                if result.proved:
+                    return strategy, result
+                results[strategy] = result
+    finally:
+        for receiver, (_, process) in running.items():
+            stop_task(process, receiver)
+    # зависшие стратегии - результат по лимиту времени
+    strategy = strategies[0]
+    return strategy, results.get(strategy, ProofResult(LIMIT_REACHED, reason="time"))
@@ -1,172 +1,260 @@
-from dataclasses import dataclass
+import hashlib
+import itertools
+import json
+import os
+import re
+import tempfile
+import weakref
+from collections import OrderedDict
+from functools import wraps
 from typing import List, Tuple, Union
 
-@dataclass
-class Pred:
+class Node:
+    """
+    Узел формулы: неизменяемый, со слотами и hash-consing -
+    одинаковые подформулы - один и тот же объект (формула - DAG),
+    поэтому равенство и хеш - по тождеству.
+    Результаты преобразований запоминаются в узле (см. memoized).
+    """
+    __slots__ = ("__weakref__", "_memo")
+    fields: Tuple[str, ...] = ()
+    _nodes = weakref.WeakValueDictionary()  # (класс, поля...) -> узел
+
+    def __new__(cls, *values, **named):
+        # поля - по позиции или по имени, как у конструктора dataclass
+        if len(values) > len(cls.fields):
+            raise TypeError(f"{cls.__name__}: лишние аргументы {values[len(cls.fields):]!r}")
+        repeated = [name for name in cls.fields[:len(values)] if name in named]
+        if repeated:
+            raise TypeError(f"{cls.__name__}: поля заданы дважды: {', '.join(repeated)}")
+        missing = [name for name in cls.fields[len(values):] if name not in named]
+        if missing:
+            raise TypeError(f"{cls.__name__}: не заданы поля {', '.join(missing)}")
+        values += tuple(named.pop(name) for name in cls.fields[len(values):])
+        if named:
+            raise TypeError(f"{cls.__name__}: неизвестные поля {', '.join(named)}")
+        key = (cls,) + values
+        node = Node._nodes.get(key)
+        if node is None:
+            node = object.__new__(cls)
+            for name, value in zip(cls.fields, values):
+                object.__setattr__(node, name, value)
+            object.__setattr__(node, "_memo", {})
+            Node._nodes[key] = node
+        return node
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} неизменяем")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} неизменяем")
+
+    def __reduce__(self):
+        return type(self), tuple(getattr(self, name) for name in self.fields)
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.fields)
+        return f"{type(self).__name__}({fields})"
+
+
+class Pred(Node):
+    __slots__ = fields = ("name", "args")
     name: str
     args: Tuple[str, ...]
 
 
-@dataclass
-class Not:
+class Not(Node):
+    __slots__ = fields = ("sub",)
     sub: "Formula"
 
 
-@dataclass
-class And:
+class And(Node):
+    __slots__ = fields = ("left", "right")
     left: "Formula"
     right: "Formula"
 
 
-@dataclass
-class Or:
+class Or(Node):
+    __slots__ = fields = ("left", "right")
     left: "Formula"
     right: "Formula"
 
 
-@dataclass
-class Implies:
+class Implies(Node):
+    __slots__ = fields = ("left", "right")
     left: "Formula"
     right: "Formula"
 
 
-Formula = Union[Pred, Not, And, Or, Implies]
+class Forall(Node):
+    __slots__ = fields = ("var", "sub")
+    var: str
+    sub: "Formula"
 
-def tokenize(s: str):
-    """
-    Превращает строку в токены.
-    Поддерживает: (), имена русские/английские, ¬, ∧, ∨, ->, →.
-    """
-    tokens = []
-    i = 0
 
-    import re
-    name_re = re.compile(r"[A-Za-zА-Яа-яЁё_][A-Za-zА-Яа-яЁё_0-9]*")
+class Exists(Node):
+    __slots__ = fields = ("var", "sub")
+    var: str
+    sub: "Formula"
 
-    while i < len(s):
-        ch = s[i]
 
-        if ch.isspace():
-            i += 1
+Formula = Union[Pred, Not, And, Or, Implies, Forall, Exists]
+
+
+class ParseError(ValueError):
+    # ошибка разбора: position - позиция в строке формулы,
+    # line и column (с 1) - место в файле при потоковой загрузке,
+    # reason - текст ошибки без позиции (по умолчанию - message)
+    def __init__(self, message, position=None, line=None, column=None, reason=None):
+        super().__init__(message)
+        self.message = message
+        self.reason = message if reason is None else reason
+        self.position = position
+        self.line = line
+        self.column = column
+
+
+# все токены одним регулярным выражением (компилируется один раз)
+# частые альтернативы - первыми, ERROR - любой другой символ
+TOKEN_RE = re.compile(r"""
+    (?P<NAME>[A-Za-zА-Яа-яЁё_][A-Za-zА-Яа-яЁё_0-9]*)
+  | (?P<SPACE>\s+)
+  | (?P<LPAREN>\()
+  | (?P<RPAREN>\))
+  | (?P<COMMA>,)
+  | (?P<IMPLIES>->|→)
+  | (?P<NOT>[¬!])
+  | (?P<AND>[∧&])
+  | (?P<OR>[∨|])
+  | (?P<FORALL>∀)
+  | (?P<EXISTS>∃)
+  | (?P<ERROR>.)
+""", re.VERBOSE | re.DOTALL)
+
+
+def iter_tokens(s: str, positions: bool = False):
+    """
+    Токены строки по одному (лениво), в конце ("END", "").
+    Поддерживает: (), имена русские/английские, ¬, ∧, ∨, ->, →, ∀, ∃.
+    positions - токены с позицией: (тип, текст, позиция)
+    """
+    for m in TOKEN_RE.finditer(s):
+        kind = m.lastgroup
+        if kind == "SPACE":
             continue
+        if kind == "ERROR":
+            raise ParseError(f"Неожиданный символ {m.group()!r} в позиции {m.start()}", m.start(),
+                             reason=f"Неожиданный символ {m.group()!r}")
+        yield (kind, m.group(), m.start()) if positions else (kind, m.group())
+    yield ("END", "", len(s)) if positions else ("END", "")
 
-        # ---- импликации ----
-        if s.startswith("->", i):
-            tokens.append(("IMPLIES", "->"))
-            i += 2
-            continue
 
-        if s.startswith("→", i):   # Иногда ChatGPT пишет импликацию так
-            tokens.append(("IMPLIES", "→"))
-            i += 1
-            continue
+def tokenize(s: str):
+    """
+    Превращает строку в список токенов.
+    """
+    return list(iter_tokens(s))
 
-        # ---- односимвольные ----
-        if ch == "(":
-            tokens.append(("LPAREN", ch))
-            i += 1
-            continue
-        if ch == ")":
-            tokens.append(("RPAREN", ch))
-            i += 1
-            continue
-        if ch == ",":
-            tokens.append(("COMMA", ch))
-            i += 1
-            continue
-        if ch in ["¬", "!"]:
-            tokens.append(("NOT", ch))
-            i += 1
-            continue
-        if ch in ["∧", "&"]:
-            tokens.append(("AND", ch))
-            i += 1
-            continue
-        if ch in ["∨", "|"]:
-            tokens.append(("OR", ch))
-            i += 1
-            continue
 
-        # ---- имена ----
-        m = name_re.match(s, i)
-        if m:
-            tokens.append(("NAME", m.group(0)))
-            i = m.end()
-            continue
+BINARY = {"IMPLIES": Implies, "OR": Or, "AND": And}
+QUANTIFIERS = {"FORALL": Forall, "EXISTS": Exists}
+PRIORITY = {"IMPLIES": 1, "OR": 2, "AND": 3, "NOT": 4, "FORALL": 4, "EXISTS": 4}
 
-        raise ValueError(f"Неожиданный символ {ch!r} в позиции {i}")
 
-    tokens.append(("END", ""))
-    return tokens
+def reduce_operator(operator, operands):
+    # применение оператора (вид, переменная квантора) к последним формулам стека
+    operator, var = operator
+    if operator == "NOT":
+        operands[-1] = Not(operands[-1])
+    elif operator in QUANTIFIERS:
+        operands[-1] = QUANTIFIERS[operator](var, operands[-1])
+    else:
+        right = operands.pop()
+        operands[-1] = BINARY[operator](operands[-1], right)
 
 
 class Parser:
     def __init__(self, tokens):
-        self.tokens = tokens
-        self.pos = 0
+        # токены - любой итерируемый объект (список или iter_tokens), читаются по одному
+        # position - позиция текущего токена (если токены с позициями)
+        self.tokens = iter(tokens)
+        self.advance()
+
+    def advance(self):
+        tok = next(self.tokens)
+        self.current = tok[:2]
+        self.position = tok[2] if len(tok) > 2 else None
+
+    def error(self, message):
+        return ParseError(message, self.position)
 
     def peek(self):
-        return self.tokens[self.pos]
+        return self.current
 
     def consume(self, ttype=None):
-        tok = self.tokens[self.pos]
+        tok = self.current
         if ttype and tok[0] != ttype:
-            raise ValueError(f"Ожидался {ttype}, а получено {tok}")
-        self.pos += 1
+            raise self.error(f"Ожидался {ttype}, а получено {tok}")
+        if tok[0] != "END":
+            self.advance()
         return tok
 
     def parse(self) -> Formula:
-        node = self.parse_implication()
-        if self.peek()[0] != "END":
-            raise ValueError("Лишние токены после формулы")
-        return node
-
-    # Импликация (низший приоритет)
-    def parse_implication(self) -> Formula:
-        left = self.parse_or()
-        if self.peek()[0] == "IMPLIES":
-            self.consume("IMPLIES")
-            right = self.parse_implication()
-            return Implies(left, right)
-        return left
-
-    # ∨
-    def parse_or(self) -> Formula:
-        node = self.parse_and()
-        while self.peek()[0] == "OR":
-            self.consume("OR")
-            right = self.parse_and()
-            node = Or(node, right)
-        return node
-
-    # ∧
-    def parse_and(self) -> Formula:
-        node = self.parse_unary()
-        while self.peek()[0] == "AND":
-            self.consume("AND")
-            right = self.parse_unary()
-            node = And(node, right)
-        return node
-
-    # ¬
-    def parse_unary(self) -> Formula:
-        if self.peek()[0] == "NOT":
-            self.consume("NOT")
-            sub = self.parse_unary()
-            return Not(sub)
-        return self.parse_atom()
+        """
+        Разбор без рекурсии (сортировочная станция): стек операторов и стек формул.
+        Приоритеты: ¬, ∀x, ∃x > ∧ > ∨ > -> (∧ и ∨ - левоассоциативны, -> - правоассоциативна).
+        Квантор, как и ¬, относится к ближайшей формуле: ∀x (P(x) -> Q(x)).
+        """
+        operands = []
+        operators = []  # (вид, переменная квантора или None): ¬, (, кванторы и бинарные связки
+        expect_operand = True
+        while True:
+            tok = self.peek()
+            kind = tok[0]
+            if expect_operand:
+                if kind in ("NOT", "LPAREN"):
+                    self.consume(kind)
+                    operators.append((kind, None))
+                elif kind in QUANTIFIERS:
+                    self.consume(kind)
+                    operators.append((kind, self.parse_variable()))
+                else:
+                    operands.append(self.parse_atom())
+                    expect_operand = False
+            elif kind in BINARY:
+                priority = PRIORITY[kind]
+                # правоассоциативная связка не сворачивает такую же слева
+                while operators and operators[-1][0] != "LPAREN" and (
+                        PRIORITY[operators[-1][0]] > priority
+                        or PRIORITY[operators[-1][0]] == priority and kind != "IMPLIES"):
+                    reduce_operator(operators.pop(), operands)
+                self.consume(kind)
+                operators.append((kind, None))
+                expect_operand = True
+            else:
+                while operators and operators[-1][0] != "LPAREN":
+                    reduce_operator(operators.pop(), operands)
+                if kind == "RPAREN" and operators:
+                    self.consume("RPAREN")
+                    operators.pop()
+                elif operators:
+                    raise self.error(f"Ожидался RPAREN, а получено {tok}")
+                elif kind != "END":
+                    raise self.error("Лишние токены после формулы")
+                else:
+                    return operands[0]
+
+    # переменная квантора
+    def parse_variable(self) -> str:
+        tok = self.peek()
+        if tok[0] != "NAME" or not tok[1][0].islower():
+            raise self.error(f"Ожидалась переменная квантора, а получено {tok}")
+        return self.consume("NAME")[1]
 
-    # скобки или предикат
+    # предикат
     def parse_atom(self) -> Formula:
         tok = self.peek()
 
-        # (expr)
-        if tok[0] == "LPAREN":
-            self.consume("LPAREN")
-            node = self.parse_implication()
-            self.consume("RPAREN")
-            return node
-
         # Предикат (включая 0-арные)
         if tok[0] == "NAME":
             name = self.consume("NAME")[1]
@@ -184,148 +272,606 @@ class Parser:
             else:
                 return Pred(name, tuple())
 
-        raise ValueError(f"Неожиданный токен {tok} в атоме")
+        raise self.error(f"Неожиданный токен {tok} в атоме")
 
 
 def parse_formula_str(s: str) -> Formula:
-    tokens = tokenize(s)
+    tokens = iter_tokens(s, positions=True)
     p = Parser(tokens)
     return p.parse()
 
 
 # ========== ПРЕОБРАЗОВАНИЕ В КНФ ==========
 
-def eliminate_implications(node: Formula) -> Formula:
-    if isinstance(node, Implies):
-        left = eliminate_implications(node.left)
-        right = eliminate_implications(node.right)
-        # A → B ≡ ¬A ∨ B
-        return Or(Not(left), right)
-    if isinstance(node, And):
-        return And(eliminate_implications(node.left), eliminate_implications(node.right))
-    if isinstance(node, Or):
-        return Or(eliminate_implications(node.left), eliminate_implications(node.right))
+def memoized(step):
+    """
+    Преобразование формулы без рекурсии (явный стек) с памятью в узлах:
+    общая подформула преобразуется один раз, результат тоже общий.
+    step(node, result) строит результат узла, result(part) - результат части
+    или None, если часть еще не преобразована: тогда результат step не важен,
+    недостающие части преобразуются, и step вызывается снова.
+    """
+    key = step.__name__
+
+    @wraps(step)
+    def transform(node: Formula) -> Formula:
+        missing = []
+
+        def result(part):
+            memo = part._memo
+            if key in memo:
+                return memo[key]
+            missing.append(part)
+            return None
+
+        stack = [node]
+        held = []  # новые узлы-части живут до конца преобразования (таблица узлов - слабая)
+        while stack:
+            current = stack[-1]
+            if key in current._memo:
+                stack.pop()
+                continue
+            value = step(current, result)
+            if missing:
+                stack.extend(missing)
+                held.extend(missing)
+                missing.clear()
+            else:
+                stack.pop()
+                current._memo[key] = value
+        return node._memo[key]
+    return transform
+
+
+@memoized
+def eliminate_implications(node, result):
+    if isinstance(node, (Implies, And, Or)):
+        left, right = result(node.left), result(node.right)
+        if left is None or right is None:
+            return None
+        if isinstance(node, Implies):
+            # A → B ≡ ¬A ∨ B
+            return Or(Not(left), right)
+        return type(node)(left, right)
     if isinstance(node, Not):
-        return Not(eliminate_implications(node.sub))
+        sub = result(node.sub)
+        return None if sub is None else Not(sub)
+    if isinstance(node, (Forall, Exists)):
+        sub = result(node.sub)
+        return None if sub is None else type(node)(node.var, sub)
     return node
 
 
-def to_nnf(node: Formula) -> Formula:
+@memoized
+def to_nnf(node, result):
     """
     Преобразование в NNF (Normal Negation Form)
     """
     if isinstance(node, Not):
         sub = node.sub
         if isinstance(sub, Not):
-            return to_nnf(sub.sub)
-        if isinstance(sub, And):
-            return Or(to_nnf(Not(sub.left)), to_nnf(Not(sub.right)))
-        if isinstance(sub, Or):
-            return And(to_nnf(Not(sub.left)), to_nnf(Not(sub.right)))
-        return Not(to_nnf(sub))
-
-    if isinstance(node, And):
-        return And(to_nnf(node.left), to_nnf(node.right))
-    if isinstance(node, Or):
-        return Or(to_nnf(node.left), to_nnf(node.right))
+            return result(sub.sub)
+        if isinstance(sub, (And, Or)):
+            left, right = result(Not(sub.left)), result(Not(sub.right))
+            if left is None or right is None:
+                return None
+            return Or(left, right) if isinstance(sub, And) else And(left, right)
+        if isinstance(sub, (Forall, Exists)):
+            # ¬∀x F ≡ ∃x ¬F, ¬∃x F ≡ ∀x ¬F
+            inner = result(Not(sub.sub))
+            if inner is None:
+                return None
+            return Exists(sub.var, inner) if isinstance(sub, Forall) else Forall(sub.var, inner)
+        if isinstance(sub, Pred):
+            return node
+        sub = result(sub)
+        return None if sub is None else Not(sub)
+
+    if isinstance(node, (And, Or)):
+        left, right = result(node.left), result(node.right)
+        return None if left is None or right is None else type(node)(left, right)
+    if isinstance(node, (Forall, Exists)):
+        sub = result(node.sub)
+        return None if sub is None else type(node)(node.var, sub)
     return node
 
 
-def distribute_or_over_and(node: Formula) -> Formula:
-    if isinstance(node, Or):
-        A = distribute_or_over_and(node.left)
-        B = distribute_or_over_and(node.right)
-
+@memoized
+def distribute_or_over_and(node, result):
+    if isinstance(node, (And, Or)):
+        A, B = result(node.left), result(node.right)
+        if A is None or B is None:
+            return None
+        if isinstance(node, And):
+            return And(A, B)
+        # части уже в КНФ: (a ∧ b) ∨ B ≡ (a ∨ B) ∧ (b ∨ B)
         if isinstance(A, And):
-            return And(
-                distribute_or_over_and(Or(A.left, B)),
-                distribute_or_over_and(Or(A.right, B)),
-            )
-        if isinstance(B, And):
-            return And(
-                distribute_or_over_and(Or(A, B.left)),
-                distribute_or_over_and(Or(A, B.right)),
-            )
-        return Or(A, B)
-
-    if isinstance(node, And):
-        return And(
-            distribute_or_over_and(node.left),
-            distribute_or_over_and(node.right)
-        )
-
+            left, right = result(Or(A.left, B)), result(Or(A.right, B))
+        elif isinstance(B, And):
+            left, right = result(Or(A, B.left)), result(Or(A, B.right))
+        else:
+            return Or(A, B)
+        return None if left is None or right is None else And(left, right)
     return node
 
 
-def to_cnf(node: Formula) -> Formula:
-    node = eliminate_implications(node)
-    node = to_nnf(node)
-    node = distribute_or_over_and(node)
-    return node
+# ========== КВАНТОРЫ: МИНИМИЗАЦИЯ ОБЛАСТЕЙ И СКОЛЕМИЗАЦИЯ ==========
 
+def is_variable(term) -> bool:
+    # переменная - имя с маленькой буквы (функциональный терм - кортеж)
+    return isinstance(term, str) and term[0].islower()
 
-# ========== СБОР КЛАУЗ ==========
 
-def collect_literals(node: Formula):
-    if isinstance(node, Or):
-        return collect_literals(node.left) + collect_literals(node.right)
+def term_variables(term):
+    # переменные терма слева направо (термы Сколема - (имя, аргументы...))
+    if is_variable(term):
+        yield term
+    elif isinstance(term, tuple):
+        for arg in term[1:]:
+            yield from term_variables(arg)
+
+
+@memoized
+def has_quantifiers(node, result):
+    if isinstance(node, (Forall, Exists)):
+        return True
+    if isinstance(node, Not):
+        return result(node.sub)
+    if isinstance(node, (And, Or, Implies)):
+        left, right = result(node.left), result(node.right)
+        return None if left is None or right is None else left or right
+    return False
 
-    if isinstance(node, Not) and isinstance(node.sub, Pred):
-        return [("not", (node.sub.name, tuple(node.sub.args)))]
 
+@memoized
+def free_variable_set(node, result):
     if isinstance(node, Pred):
-        return [(node.name, tuple(node.args))]
+        return frozenset(var for arg in node.args for var in term_variables(arg))
+    if isinstance(node, Not):
+        return result(node.sub)
+    if isinstance(node, (And, Or, Implies)):
+        left, right = result(node.left), result(node.right)
+        return None if left is None or right is None else left | right
+    sub = result(node.sub)
+    return None if sub is None else sub - {node.var}
+
+
+@memoized
+def miniscope(node, result):
+    """
+    Минимизация областей кванторов в NNF (кванторы опускаются как можно ниже):
+    ∀x (A ∧ B) ≡ ∀x A ∧ ∀x B, ∃x (A ∨ B) ≡ ∃x A ∨ ∃x B,
+    Qx (A ∘ B) ≡ Qx A ∘ B, если x не входит в B, Qx A ≡ A, если x не входит в A.
+    Функции Сколема получают меньше аргументов, клаузы - меньше литералов.
+    """
+    if isinstance(node, (And, Or)):
+        left, right = result(node.left), result(node.right)
+        return None if left is None or right is None else type(node)(left, right)
+    if not isinstance(node, (Forall, Exists)):
+        return node
+    sub = result(node.sub)
+    if sub is None:
+        return None
+    var = node.var
+    if var not in free_variable_set(sub):
+        return sub
+    if isinstance(sub, (And, Or)):
+        splits = isinstance(sub, And) == isinstance(node, Forall)
+        if splits or var not in free_variable_set(sub.left) or var not in free_variable_set(sub.right):
+            left, right = result(type(node)(var, sub.left)), result(type(node)(var, sub.right))
+            return None if left is None or right is None else type(sub)(left, right)
+    return type(node)(var, sub)
+
+
+def fresh_variable(used) -> str:
+    # новая переменная: одна буква (переменная в обоих пруверах), затем x1, x2, ...
+    for name in itertools.chain("xyzuvw", "abcdefghijklmnopqrst", (f"x{i}" for i in itertools.count(1))):
+        if name not in used:
+            return name
+
+
+def skolemize(node: Formula, names) -> Formula:
+    """
+    Сколемизация NNF после минимизации областей (обход с явным стеком, слева направо):
+    ∃y F -> F[y := skN(переменные)], переменные - свободные переменные ∃y F,
+    без переменных - константа SkN; ∀x F -> F, повторно связанная переменная
+    переименовывается в новую. names - счетчик номеров (общий с DEFn).
+    """
+    used = set(free_variable_set(node))
+    results = []
+    stack = [(node, {})]  # (узел, замены переменных) или (класс, None) - сборка
+    while stack:
+        node, env = stack.pop()
+        if env is None:
+            right = results.pop()
+            results[-1] = node(results[-1], right)
+        elif not env and not has_quantifiers(node):
+            results.append(node)
+        elif isinstance(node, Pred):
+            results.append(Pred(node.name, tuple(env.get(arg, arg) for arg in node.args)))
+        elif isinstance(node, Not):
+            sub = node.sub
+            results.append(Not(Pred(sub.name, tuple(env.get(arg, arg) for arg in sub.args))))
+        elif isinstance(node, (And, Or)):
+            stack.append((type(node), None))
+            stack.append((node.right, env))
+            stack.append((node.left, env))
+        elif isinstance(node, Forall):
+            var = node.var if node.var not in used else fresh_variable(used)
+            used.add(var)
+            stack.append((node.sub, {**env, node.var: var}))
+        else:
+            args = {}
+            for var in free_variables(node):
+                args.update(dict.fromkeys(term_variables(env.get(var, var))))
+            number = next(names)
+            term = (f"sk{number}",) + tuple(args) if args else f"Sk{number}"
+            stack.append((node.sub, {**env, node.var: term}))
+    return results[0]
+
+
+# ========== ОПРЕДЕЛЕНИЯ (ПЕРЕИМЕНОВАНИЕ ПОДФОРМУЛ) ==========
+
+def free_variables(node: Formula) -> Tuple[str, ...]:
+    # свободные переменные формулы (с маленькой буквы, и внутри термов) в порядке появления
+    found = {}
+    stack = [(node, frozenset())]  # (узел, связанные переменные)
+    while stack:
+        node, bound = stack.pop()
+        if isinstance(node, Pred):
+            for arg in node.args:
+                for var in term_variables(arg):
+                    if var not in bound:
+                        found.setdefault(var, None)
+        elif isinstance(node, Not):
+            stack.append((node.sub, bound))
+        elif isinstance(node, (And, Or, Implies)):
+            stack.append((node.right, bound))
+            stack.append((node.left, bound))
+        else:
+            stack.append((node.sub, bound | {node.var}))
+    return tuple(found)
+
+
+def rename_subformulas(node: Formula, definitions: List[Formula], names) -> Tuple[Formula, int]:
+    """
+    Переименование подформул NNF (Плейстед - Гринбаум).
+    Возвращает формулу и число ее клауз после дистрибутивности.
+    Дизъюнкция, у которой произведение числа клауз частей больше суммы,
+    получает вместо большей части предикат DEFn(переменные) и определение ¬DEFn ∨ часть
+    (в NNF все подформулы положительны - нужна только одна импликация).
+    Формулы без такого роста не меняются.
+    """
+    results = []  # (формула, число клауз) обработанных частей
+    stack = [(node, False)]  # (узел, части обработаны)
+    while stack:
+        node, ready = stack.pop()
+        if not isinstance(node, (And, Or)):
+            results.append((node, 1))
+        elif not ready:
+            # левая часть обрабатывается первой: номера DEFn - слева направо
+            stack.append((node, True))
+            stack.append((node.right, False))
+            stack.append((node.left, False))
+        else:
+            right, right_count = results.pop()
+            left, left_count = results.pop()
+            if isinstance(node, And):
+                results.append((And(left, right), left_count + right_count))
+                continue
+            if left_count * right_count > left_count + right_count:
+                if left_count >= right_count:
+                    left, left_count = define(left, definitions, names), 1
+                else:
+                    right, right_count = define(right, definitions, names), 1
+            results.append((Or(left, right), left_count * right_count))
+    return results[0]
+
+
+def define(node: Formula, definitions: List[Formula], names) -> Formula:
+    # новый предикат для подформулы и определение ¬DEFn ∨ подформула
+    pred = Pred(f"DEF{next(names)}", free_variables(node))
+    definitions.append(Or(Not(pred), node))
+    return pred
+
+
+CNF_MODES = ("distribute", "definitional")
+
+
+def to_cnf(node: Formula, mode: str = "distribute", names=None) -> Formula:
+    """
+    mode: "distribute" - дистрибутивность (экспоненциальный рост на (A∧B)∨(C∧D)∨...),
+          "definitional" - переименование подформул там, где дистрибутивность дает рост,
+          число клауз линейно от размера формулы
+    names - счетчик номеров предикатов DEFn и символов Сколема (общий для формул одного текста)
+    Кванторы: минимизация областей, затем сколемизация (свободные переменные - под ∀).
+    """
+    if mode not in CNF_MODES:
+        raise ValueError(f"Неизвестный режим КНФ {mode!r}")
+    names = names or itertools.count(1)
+    node = eliminate_implications(node)
+    node = to_nnf(node)
+    if has_quantifiers(node):
+        node = skolemize(miniscope(node), names)
+    if mode == "definitional":
+        definitions = []
+        node, _ = rename_subformulas(node, definitions, names)
+        for definition in definitions:
+            node = And(node, definition)
+    node = distribute_or_over_and(node)
+    return node
 
-    raise ValueError(f"Ожидался литерал, а получено: {node}")
 
+# ========== СБОР КЛАУЗ ==========
 
-def collect_clauses(node: Formula):
-    if isinstance(node, And):
-        return collect_clauses(node.left) + collect_clauses(node.right)
-    return [collect_literals(node)]
+def collect_literals(node: Formula, literals=None):
+    # литералы дизъюнкции слева направо, дописываются в список literals
+    if literals is None:
+        literals = []
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Or):
+            stack.append(node.right)
+            stack.append(node.left)
+        elif isinstance(node, Not) and isinstance(node.sub, Pred):
+            literals.append(("not", (node.sub.name, tuple(node.sub.args))))
+        elif isinstance(node, Pred):
+            literals.append((node.name, tuple(node.args)))
+        else:
+            raise ValueError(f"Ожидался литерал, а получено: {node}")
+    return literals
+
+
+def collect_clauses(node: Formula, clauses=None):
+    # клаузы КНФ слева направо, дописываются в список clauses
+    if clauses is None:
+        clauses = []
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, And):
+            stack.append(node.right)
+            stack.append(node.left)
+        else:
+            clauses.append(collect_literals(node))
+    return clauses
 
 
 # ========== РАЗБИЕНИЕ ПО ЗАПЯТЫМ НА ВЕРХНЕМ УРОВНЕ ==========
 
 def split_top_commas(text: str):
-    parts = []
+    return [part for _, part in split_top_commas_at(text)]
+
+
+def split_top_commas_at(text: str):
+    # части текста между запятыми верхнего уровня с позициями начала: (позиция, часть)
     depth = 0
-    buff = []
-    for ch in text:
+    start = 0
+    for i, ch in enumerate(text):
         if ch == "(":
             depth += 1
         elif ch == ")":
             depth -= 1
+        elif ch == "," and depth == 0:
+            yield from stripped_part(text, start, i)
+            start = i + 1
+    yield from stripped_part(text, start, len(text))
+
+
+def stripped_part(text: str, start: int, end: int):
+    # непустая часть text[start:end] без пробелов по краям и ее позиция
+    part = text[start:end]
+    stripped = part.strip()
+    if stripped:
+        yield start + len(part) - len(part.lstrip()), stripped
+
+
+# ========== КЭШ РАЗБОРА И КНФ ==========
+
+def to_tuple(item):
+    # списки JSON обратно в кортежи литералов
+    if isinstance(item, list):
+        return tuple(to_tuple(x) for x in item)
+    return item
+
+
+class ClauseCache:
+    """
+    LRU-кэш: (режим КНФ, формула с нормализованными пробелами) -> клаузы.
+    Предикаты DEFn и символы Сколема в кэше нумеруются с 1 внутри формулы
+    и перенумеровываются при выдаче.
+    directory - необязательный постоянный слой на диске:
+    файл JSON на формулу, имя файла - SHA-256 ключа.
+    """
 
-        if ch == "," and depth == 0:
-            part = "".join(buff).strip()
-            if part:
-                parts.append(part)
-            buff = []
+    def __init__(self, maxsize: int = 1024, directory=None):
+        self.maxsize = maxsize
+        self.directory = directory
+        self.entries = OrderedDict()  # ключ -> (клаузы, число определений)
+        self.hits = 0
+        self.misses = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest + ".json")
+
+    def lookup(self, f_str: str, mode: str):
+        # (клаузы, число определений DEFn) формулы: из памяти, с диска или разбором
+        key = mode + "\n" + " ".join(f_str.split())
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        entry = self.load(key) if self.directory is not None else None
+        if entry is not None:
+            self.hits += 1
         else:
-            buff.append(ch)
+            names = itertools.count(1)
+            clauses = collect_clauses(to_cnf(parse_formula_str(f_str), mode, names))
+            entry = clauses, next(names) - 1
+            self.misses += 1
+            if self.directory is not None:
+                self.save(key, entry)
+
+        self.entries[key] = entry
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        return entry
+
+    def load(self, key: str):
+        # запись с диска или None: нет файла, файл испорчен или недописан - промах
+        try:
+            with open(self.path(key), encoding="utf-8") as f:
+                data = json.load(f)
+            clauses = [[to_tuple(lit) for lit in clause] for clause in data["clauses"]]
+            definitions = data["definitions"]
+        except (OSError, ValueError, LookupError, TypeError):
+            return None
+        if not isinstance(definitions, int):
+            return None
+        return clauses, definitions
+
+    def save(self, key: str, entry):
+        # запись через собственный временный файл в том же каталоге: параллельные писатели
+        # не смешиваются, читатели видят файл целиком; ошибка записи - кэш без записи
+        clauses, definitions = entry
+        try:
+            fd, temporary = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"clauses": clauses, "definitions": definitions}, f, ensure_ascii=False)
+            os.replace(temporary, self.path(key))
+        except OSError:
+            try:
+                os.remove(temporary)
+            except OSError:
+                pass
+
+    def clear(self):
+        # очистка памяти (файлы на диске остаются)
+        self.entries.clear()
+
+
+# кэш по умолчанию для parse_all_to_clauses и iter_clauses
+formula_cache = ClauseCache()
+
+
+def rename_term(term, mapping):
+    # символы Сколема терма по mapping
+    if isinstance(term, tuple):
+        return (mapping.get(term[0], term[0]),) + tuple(rename_term(arg, mapping) for arg in term[1:])
+    return mapping.get(term, term)
+
+
+def rename_definitions(clauses, count: int, names):
+    # номера 1..count формулы (DEFn, skn, Skn) -> следующие номера общего счетчика
+    mapping = {}
+    for i in range(1, count + 1):
+        number = next(names)
+        for prefix in ("DEF", "sk", "Sk"):
+            mapping[f"{prefix}{i}"] = f"{prefix}{number}"
+    renamed = []
+    for clause in clauses:
+        new_clause = []
+        for lit in clause:
+            if lit[0] == "not":
+                name, args = lit[1]
+                lit = ("not", (mapping.get(name, name), tuple(rename_term(arg, mapping) for arg in args)))
+            else:
+                name, args = lit
+                lit = (mapping.get(name, name), tuple(rename_term(arg, mapping) for arg in args))
+            new_clause.append(lit)
+        renamed.append(new_clause)
+    return renamed
 
-    tail = "".join(buff).strip()
-    if tail:
-        parts.append(tail)
 
-    return parts
+def formula_to_clauses(f_str: str, mode: str = "distribute", names=None, cache=formula_cache):
+    """
+    Клаузы одной формулы. names - общий счетчик предикатов DEFn,
+    cache - ClauseCache или None (без кэша).
+    """
+    if names is None:
+        names = itertools.count(1)
+    if cache is None:
+        return collect_clauses(to_cnf(parse_formula_str(f_str), mode, names))
+    clauses, count = cache.lookup(f_str, mode)
+    if count:
+        return rename_definitions(clauses, count, names)
+    # копии списков: кэшированные клаузы не меняются снаружи
+    return [list(clause) for clause in clauses]
 
 
 # ========== ОСНОВНАЯ ФУНКЦИЯ ==========
 
-def parse_all_to_clauses(text: str):
+def parse_all_to_clauses(text: str, mode: str = "distribute", cache=formula_cache):
     """
     Принимает строку:
       "A, B -> C, ¬(D → E)"
     Возвращает список клауз:
       [ [('A',())], [('not',('B',())), ('C',())], ... ]
+    mode - режим КНФ (см. to_cnf), cache - ClauseCache или None
     """
     clauses = []
+    names = itertools.count(1)
     for f_str in split_top_commas(text):
         if not f_str:
             continue
-        ast = parse_formula_str(f_str)
-        cnf = to_cnf(ast)
-        clauses.extend(collect_clauses(cnf))
+        clauses.extend(formula_to_clauses(f_str, mode, names, cache))
     return clauses
+
+
+def to_src2_clauses(clauses):
+    """
+    Клаузы в формате src2/res.py: литерал (имя, (аргументы)) -> (имя, аргумент1, ...).
+    Функциональные термы (символы Сколема) - уже в формате src2: ('sk1', 'x').
+    """
+    converted = []
+    for clause in clauses:
+        new_clause = []
+        for lit in clause:
+            if lit[0] == "not":
+                name, args = lit[1]
+                lit = ("not", (name,) + args)
+            else:
+                name, args = lit
+                lit = (name,) + args
+            new_clause.append(lit)
+        converted.append(new_clause)
+    return converted
+
+
+# ========== ПОТОКОВАЯ ЗАГРУЗКА БАЗЫ ЗНАНИЙ ==========
+
+def iter_clauses(source, mode: str = "distribute", cache=formula_cache):
+    """
+    Читает формулы построчно и выдает клаузы по одной.
+    source - путь к файлу, открытый файл или итерируемое строк.
+    В строке - одна или несколько формул через запятую (формула не переносится),
+    пустые строки и строки, начинающиеся с #, пропускаются.
+    Ошибка разбора - ParseError с номером строки и столбца.
+    cache - ClauseCache или None
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, encoding="utf-8") as f:
+            yield from iter_clauses(f, mode, cache)
+        return
+
+    names = itertools.count(1)
+    for line_number, line in enumerate(source, 1):
+        if line.lstrip().startswith("#"):
+            continue
+        for start, f_str in split_top_commas_at(line):
+            try:
+                clauses = formula_to_clauses(f_str, mode, names, cache)
+            except ParseError as error:
+                column = start + (error.position or 0) + 1
+                raise ParseError(f"Строка {line_number}, столбец {column}: {error.reason}",
+                                 error.position, line_number, column, error.reason) from None
+            yield from clauses
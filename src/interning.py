@@ -0,0 +1,96 @@
+# Интернирование термов и литералов (hash-consing).
+# Каждому различному терму - один канонический объект и целый номер:
+# равенство канонических термов - сравнение номеров (или объектов),
+# одинаковые подтермы хранятся один раз.
+# Таблица - у каждого поиска своя (InternTable): активная таблица потока задается searching,
+# вне поиска используется таблица потока по умолчанию.
+import threading
+from contextlib import contextmanager
+
+
+class InternTable:
+    # таблица интернирования: кортеж хранится по номерам элементов,
+    # поэтому поиск записи - O(арности), а не обход всего подтерма
+    def __init__(self):
+        self.ids = {}  # атом или кортеж номеров элементов -> номер
+        self.terms = []  # номер -> канонический терм
+        self.by_identity = {}  # id(канонический терм) -> номер
+
+    def number(self, term):
+        # номер канонического объекта (или None)
+        number = self.by_identity.get(id(term))
+        if number is not None and self.terms[number] is term:
+            return number
+        return None
+
+    def store(self, key, term):
+        # номер терма с ключом key (term - объект, если записи еще нет)
+        number = self.ids.get(key)
+        if number is None:
+            number = len(self.terms)
+            self.ids[key] = number
+            self.terms.append(term)
+            self.by_identity[id(term)] = number
+        return number
+
+    def intern(self, term):
+        # номер терма, подтермы интернируются тоже
+        # явный стек: глубина вложенности не ограничена
+        number = self.number(term)
+        if number is not None:
+            return number
+        results = []
+        stack = [(term, False)]
+        while stack:
+            term, build = stack.pop()
+            if build:
+                count = len(term)
+                key = tuple(results[len(results) - count:])
+                del results[len(results) - count:]
+                number = self.ids.get(key)
+                if number is None:
+                    number = self.store(key, tuple(self.terms[item] for item in key))
+                results.append(number)
+                continue
+            number = self.number(term)
+            if number is not None:
+                results.append(number)
+            elif isinstance(term, tuple):
+                stack.append((term, True))
+                stack.extend((item, False) for item in reversed(term))
+            else:
+                results.append(self.store(term, term))
+        return results[0]
+
+
+_local = threading.local()
+
+
+def current_table():
+    # активная таблица потока
+    table = getattr(_local, "table", None)
+    if table is None:
+        table = _local.table = InternTable()
+    return table
+
+
+@contextmanager
+def searching(table):
+    # table - активная таблица потока внутри блока (прежняя восстанавливается)
+    previous = getattr(_local, "table", None)
+    _local.table = table
+    try:
+        yield table
+    finally:
+        _local.table = previous
+
+
+def intern_term(term):
+    # канонический объект терма (литерала) в активной таблице
+    table = current_table()
+    return table.terms[table.intern(term)]
+
+
+def term_id(term):
+    # номер терма в активной таблице (интернирует при первом обращении)
+    return current_table().intern(term)
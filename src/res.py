@@ -1,3 +1,12 @@
+import heapq
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+from interning import InternTable, intern_term, searching, term_id
+from sat import Solver
+
+
 def is_variable(term):
     # является ли терм переменной (начинается с маленькой буквы)
     if isinstance(term, str):
@@ -10,156 +19,588 @@ def is_predicate(lit):
     return isinstance(lit, tuple) and len(lit) == 2 and isinstance(lit[1], tuple)
 
 
+def is_function(term):
+    # функциональный терм в аргументах (имя, аргумент1, ...) - символ Сколема из helper
+    return isinstance(term, tuple)
+
+
+def walk(term, substitution):
+    # значение переменной по цепочке связей (подстановка треугольная:
+    # связанные термы сами могут содержать связанные переменные)
+    while is_variable(term) and term in substitution:
+        term = substitution[term]
+    return term
+
+
 def unify(x, y, substitution=None):
     # унификация двух термов
+    # новые связи записываются в след (trail) и отменяются при неудаче,
+    # подстановка не применяется к термам - только разыменование walk
     if substitution is None:
         substitution = {}
+    trail = []
+    stack = [(x, y)]
+    # атомы: одинаковые имя и арность, дальше в стеке - только аргументы
+    if is_predicate(x) and is_predicate(y):
+        if x[0] != y[0] or len(x[1]) != len(y[1]):
+            return None
+        stack = list(reversed(list(zip(x[1], y[1]))))
 
-    # термы одинаковы
-    if x == y:
-        return substitution
+    while stack:
+        x, y = stack.pop()
+        x = walk(x, substitution)
+        y = walk(y, substitution)
 
-    # унификация x
-    if is_variable(x):
-        # уже есть подстановка x
-        if x in substitution:
-            return unify(substitution[x], y, substitution)
-        # есть подстановка y
-        elif is_variable(y) and y in substitution:
-            return unify(x, substitution[y], substitution)
-        # нет подстановок
-        else:
-            if term_check(x, y, substitution):
-                return None
-            substitution[x] = y
-            return substitution
+        # термы одинаковы
+        if x == y:
+            continue
 
-    # аналогично для y
-    elif is_variable(y):
-        return unify(y, x, substitution)
+        # связывание переменной
+        if is_variable(x) or is_variable(y):
+            var, term = (x, y) if is_variable(x) else (y, x)
+            if term_check(var, term, substitution):
+                break
+            substitution[var] = term
+            trail.append(var)
+            continue
 
-    # унификация предикатов
-    elif is_predicate(x) and is_predicate(y):
-        if x[0] != y[0] or len(x[1]) != len(y[1]):
-            return None
-        for x_arg, y_arg in zip(x[1], y[1]):
-            substitution = unify(x_arg, y_arg, substitution)
-            if substitution is None:
-                return None
+        # функциональные термы: одинаковые имя и арность, аргументы слева направо
+        if is_function(x) and is_function(y) and x[0] == y[0] and len(x) == len(y):
+            stack.extend(reversed(list(zip(x[1:], y[1:]))))
+            continue
+        break
+    else:
         return substitution
+
+    # неудача - отмена связей по следу
+    for var in trail:
+        del substitution[var]
     return None
 
 
 def term_check(var, term, substitution):
-    # проверка вхождения переменной в терм (предикат)
-    if isinstance(term, tuple):
-        return any(term_check(var, item, substitution) for item in term)
+    # проверка вхождения переменной в терм (каждая связь разыменовывается один раз)
+    stack = [term]
+    seen = set()
+    while stack:
+        term = stack.pop()
+        if is_variable(term):
+            if term == var:
+                return True
+            if term in seen or term not in substitution:
+                continue
+            seen.add(term)
+            stack.append(substitution[term])
+        elif is_function(term):
+            # имя функции - не переменная
+            stack.extend(term[1:])
     return False
 
 
 def apply_substitution(expr, substitution):
-    # применение унификации к выражению
+    # применение унификации к литералу
+    # имена предикатов и функций не подставляются
     if not substitution:
         return expr
 
-    # переменная
+    # переменная (по цепочке связей), затем подстановка внутри значения
     if isinstance(expr, str):
-        return substitution.get(expr, expr)
+        bound = walk(expr, substitution)
+        return bound if isinstance(bound, str) else apply_substitution(bound, substitution)
 
     # кортеж (рекурсия)
     if isinstance(expr, tuple):
         # отрицание
         if len(expr) == 2 and expr[0] == 'not':
             return 'not', apply_substitution(expr[1], substitution)
-        # по всем элементам кортежа
-        else:
-            return tuple(apply_substitution(item, substitution) for item in expr)
+        # атом: имя и аргументы
+        if is_predicate(expr):
+            return expr[0], tuple(apply_substitution(arg, substitution) for arg in expr[1])
+        # функциональный терм
+        return (expr[0],) + tuple(apply_substitution(arg, substitution) for arg in expr[1:])
     return expr
 
 
-def resolve_clauses(clause1, clause2):
+def literal_key(lit):
+    # ключ литерала для индекса: (имя предиката, арность, знак)
+    if lit[0] == 'not' and is_predicate(lit[1]):
+        return lit[1][0], len(lit[1][1]), False
+    if is_predicate(lit):
+        return lit[0], len(lit[1]), True
+    return None
+
+
+def literal_args(lit):
+    # аргументы атома литерала
+    if lit[0] == 'not':
+        return lit[1][1]
+    return lit[1]
+
+
+def term_symbol(term):
+    # символ терма для индекса ('*' - переменная, иначе (имя, арность)) и его аргументы
+    if is_variable(term):
+        return '*', ()
+    if is_function(term):
+        return (term[0], len(term) - 1), term[1:]
+    return (term, 0), ()
+
+
+def term_path(terms):
+    # обход термов в прямом порядке - путь в дереве различения
+    path = []
+    stack = list(reversed(terms))
+    while stack:
+        symbol, args = term_symbol(stack.pop())
+        path.append(symbol)
+        stack.extend(reversed(args))
+    return path
+
+
+def may_unify(args1, args2):
+    # быстрая проверка до унификации: совпадение символов аргументов верхнего уровня
+    if len(args1) != len(args2):
+        return False
+    for arg1, arg2 in zip(args1, args2):
+        symbol1 = term_symbol(arg1)[0]
+        symbol2 = term_symbol(arg2)[0]
+        if symbol1 != '*' and symbol2 != '*' and symbol1 != symbol2:
+            return False
+    return True
+
+
+def index_add(index, clause):
+    # добавление клаузы в индекс литералов
+    # индекс: (предикат, арность, знак) -> дерево различения по аргументам
+    for i in range(len(clause)):
+        index_add_literal(index, clause, i)
+
+
+def index_add_literal(index, clause, i):
+    # добавление одного литерала клаузы в индекс литералов
+    key = literal_key(clause[i])
+    if key is None:
+        return
+    node = index.setdefault(key, {})
+    for symbol in term_path(literal_args(clause[i])):
+        node = node.setdefault(symbol, {})
+    # в листе (ключ None) - записи (клауза, позиция литерала)
+    node.setdefault(None, []).append((clause, i))
+
+
+def index_remove(index, clause):
+    # удаление клаузы из индекса литералов; опустевшие узлы удаляются,
+    # чтобы поиск не обходил пустые ветви
+    for lit in clause:
+        key = literal_key(lit)
+        node = index.get(key)
+        path = [(index, key)]
+        for symbol in term_path(literal_args(lit)) if node is not None else ():
+            path.append((node, symbol))
+            node = node.get(symbol)
+            if node is None:
+                break
+        if node is None or None not in node:
+            continue
+        node[None] = [entry for entry in node[None] if entry[0] is not clause]
+        if not node[None]:
+            del node[None]
+        while path and not node:
+            node, symbol = path.pop()
+            del node[symbol]
+
+
+def index_unifiable(tree, args):
+    # записи дерева, аргументы которых могут унифицироваться с args
+    return list(iter_unifiable(tree, args))
+
+
+def iter_unifiable(tree, args):
+    # те же записи по одной (поиск останавливается вместе с потребителем)
+    # (узел, оставшиеся термы запроса, сколько термов пропустить в дереве)
+    stack = [(tree, tuple(reversed(args)), 0)]
+    while stack:
+        node, terms, skip = stack.pop()
+        if skip:
+            # переменная запроса поглощает целый терм дерева
+            for symbol, child in node.items():
+                if symbol is not None:
+                    arity = 0 if symbol == '*' else symbol[1]
+                    stack.append((child, terms, skip - 1 + arity))
+            continue
+        if not terms:
+            yield from node.get(None, ())
+            continue
+        term = terms[-1]
+        rest = terms[:-1]
+        if is_variable(term):
+            stack.append((node, rest, 1))
+            continue
+        symbol, sub_terms = term_symbol(term)
+        child = node.get(symbol)
+        if child is not None:
+            stack.append((child, rest + tuple(reversed(sub_terms)), 0))
+        # переменная дерева поглощает терм запроса
+        child = node.get('*')
+        if child is not None:
+            stack.append((child, rest, 0))
+
+
+def find_partners(index, clause):
+    # клаузы с противоположным литералом, унифицируемым с литералом clause
+    # {id(клауза): (клауза, [(i, j), ...])}, i - литерал clause, j - литерал партнера
+    partners = {}
+    for i, lit in enumerate(clause):
+        key = literal_key(lit)
+        if key is None:
+            continue
+        name, arity, positive = key
+        tree = index.get((name, arity, not positive))
+        if tree is None:
+            continue
+        for other, j in index_unifiable(tree, literal_args(lit)):
+            partners.setdefault(id(other), (other, []))[1].append((i, j))
+    return partners
+
+
+def has_partner(index, lit):
+    # есть ли в индексе противоположный литерал, унифицируемый с lit
+    name, arity, positive = literal_key(lit)
+    tree = index.get((name, arity, not positive))
+    return tree is not None and next(iter_unifiable(tree, literal_args(lit)), None) is not None
+
+
+def term_shape(term, names):
+    # терм для ключа варианта: переменные заменены номерами в порядке появления
+    # (names=None - все переменные одинаковы)
+    shapes = []
+    stack = [(term, False)]
+    while stack:
+        term, build = stack.pop()
+        if build:
+            symbol, count = term
+            args = shapes[len(shapes) - count:]
+            del shapes[len(shapes) - count:]
+            shapes.append((symbol,) + tuple(args))
+        elif is_variable(term):
+            shapes.append(-1 if names is None else names.setdefault(term, len(names)))
+        else:
+            symbol, args = term_symbol(term)
+            if not args:
+                shapes.append(symbol)
+                continue
+            stack.append(((symbol, len(args)), True))
+            stack.extend((arg, False) for arg in reversed(args))
+    return shapes[0]
+
+
+def variant_key(clause):
+    # ключ клаузы с точностью до переименования переменных:
+    # литералы упорядочены без учета имен переменных, затем переменные пронумерованы
+    entries = []
+    for lit in clause:
+        key = literal_key(lit)
+        args = literal_args(lit) if key is not None else (lit,)
+        abstract = term_id((key, tuple(term_shape(arg, None) for arg in args)))
+        entries.append((abstract, key, args))
+    entries.sort(key=lambda entry: entry[0])
+    names = {}
+    shapes = [term_id((key, tuple(term_shape(arg, names) for arg in args))) for _, key, args in entries]
+    return tuple(sorted(shapes))
+
+
+def complementary(lit1, lit2):
+    # могут ли литералы быть противоположными (отсев до унификации)
+    key1 = literal_key(lit1)
+    key2 = literal_key(lit2)
+    if key1 is None or key2 is None:
+        return True
+    return (key1[:2] == key2[:2] and key1[2] != key2[2] and
+            may_unify(literal_args(lit1), literal_args(lit2)))
+
+
+def compatible(lit1, lit2):
+    # могут ли литералы одного знака унифицироваться (отсев до унификации)
+    key1 = literal_key(lit1)
+    key2 = literal_key(lit2)
+    if key1 is None or key2 is None:
+        return True
+    return key1 == key2 and may_unify(literal_args(lit1), literal_args(lit2))
+
+
+def resolve_clauses(clause1, clause2, pairs=None):
     # резолюция двух клауз (резольвент)
+    # pairs - пары позиций литералов (i, j), найденные по индексу
     resolvents = []
+    if pairs is None:
+        pairs = [(i, j) for i in range(len(clause1)) for j in range(len(clause2))]
 
-    for i, lit1 in enumerate(clause1):
-        for j, lit2 in enumerate(clause2):
-            # пары предикат - предикат с отрицанием
-            if is_predicate(lit1) and lit2[0] == 'not' and is_predicate(lit2[1]):
-                pos_lit = lit1
-                neg_lit = lit2[1]
-            elif lit1[0] == 'not' and is_predicate(lit1[1]) and is_predicate(lit2):
-                pos_lit = lit2
-                neg_lit = lit1[1]
-            else:
-                continue
+    for i, j in pairs:
+        lit1 = clause1[i]
+        lit2 = clause2[j]
+        # пары предикат - предикат с отрицанием
+        if is_predicate(lit1) and lit2[0] == 'not' and is_predicate(lit2[1]):
+            pos_lit = lit1
+            neg_lit = lit2[1]
+        elif lit1[0] == 'not' and is_predicate(lit1[1]) and is_predicate(lit2):
+            pos_lit = lit2
+            neg_lit = lit1[1]
+        else:
+            continue
 
-            # унификация (не сработает, если предикаты разные)
-            substitution = unify(pos_lit, neg_lit, {})
-            if substitution is not None:
-                # подстановка во всей клаузе
-                new_clause = []
-                # литералы из clause1 (кроме lit1) с подстановкой
-                for k, lit in enumerate(clause1):
-                    if k != i:
-                        new_lit = apply_substitution(lit, substitution)
-                        new_clause.append(new_lit)
-                # литералы из clause2 (кроме lit2) с подстановкой
-                for k, lit in enumerate(clause2):
-                    if k != j:
-                        new_lit = apply_substitution(lit, substitution)
-                        new_clause.append(new_lit)
-
-                # удаление дубликатов (склейка - 5.5)
-                unique_clause = []
-                for item in new_clause:
-                    if item not in unique_clause:
-                        unique_clause.append(item)
-                resolvents.append((unique_clause, substitution))
+        # унификация (не сработает, если предикаты разные)
+        substitution = unify(pos_lit, neg_lit, {})
+        if substitution is not None:
+            # подстановка во всей клаузе
+            new_clause = []
+            # литералы из clause1 (кроме lit1) с подстановкой
+            for k, lit in enumerate(clause1):
+                if k != i:
+                    new_lit = apply_substitution(lit, substitution)
+                    new_clause.append(new_lit)
+            # литералы из clause2 (кроме lit2) с подстановкой
+            for k, lit in enumerate(clause2):
+                if k != j:
+                    new_lit = apply_substitution(lit, substitution)
+                    new_clause.append(new_lit)
+
+            # удаление дубликатов (склейка - 5.5)
+            # литералы интернированы: сравнение по номерам
+            unique_clause = []
+            seen = set()
+            for item in new_clause:
+                item = intern_term(item)
+                if term_id(item) not in seen:
+                    seen.add(term_id(item))
+                    unique_clause.append(item)
+            resolvents.append((unique_clause, substitution))
     return resolvents
 
 
+def match(pattern, term, substitution):
+    # сопоставление: подстановка только для переменных pattern (pattern·σ = term)
+    stack = [(pattern, term)]
+    while stack:
+        pattern, term = stack.pop()
+        if is_variable(pattern):
+            if pattern not in substitution:
+                substitution[pattern] = term
+            elif substitution[pattern] is not term and term_id(substitution[pattern]) != term_id(term):
+                return None
+            continue
+        symbol1, args1 = term_symbol(pattern)
+        symbol2, args2 = term_symbol(term)
+        if symbol1 != symbol2:
+            return None
+        stack.extend(zip(args1, args2))
+    return substitution
+
+
+def match_literal(pattern_lit, lit, substitution):
+    # сопоставление литералов одного знака
+    key = literal_key(lit)
+    if literal_key(pattern_lit) != key:
+        return None
+    if key is None:
+        return substitution if pattern_lit == lit else None
+    for pattern, term in zip(literal_args(pattern_lit), literal_args(lit)):
+        substitution = match(pattern, term, substitution)
+        if substitution is None:
+            return None
+    return substitution
+
+
+def match_complement(pattern_lit, lit):
+    # сопоставление pattern_lit с дополнением lit (подстановка только для переменных pattern_lit)
+    key1 = literal_key(pattern_lit)
+    key2 = literal_key(lit)
+    if key1 is None or key2 is None or key1[:2] != key2[:2] or key1[2] == key2[2]:
+        return None
+    substitution = {}
+    for pattern, term in zip(literal_args(pattern_lit), literal_args(lit)):
+        substitution = match(pattern, term, substitution)
+        if substitution is None:
+            return None
+    return substitution
+
+
 def is_subsumed_by(clause, other_clause):
-    # является ли clause наддизъюнктом other_clause (other_clause ⊆ clause)
+    # является ли clause наддизъюнктом other_clause (other_clause·σ ⊆ clause)
     # стратегия вычеркивания - 5.8
 
     # other_clause пустая, а clause - нет, не поддизъюнкт
     if not other_clause and clause:
         return False
+    # разные литералы other_clause переходят в разные литералы clause
+    if len(other_clause) > len(clause):
+        return False
 
-    # унификация каждого литерала other_clause с каким-либо литералом clause
+    # кандидаты для каждого литерала other_clause (отсев до сопоставления)
+    candidates = []
     for other_lit in other_clause:
-        found_match = False
-        for clause_lit in clause:
-            substitution = unify(other_lit, clause_lit, {})
-            if substitution is not None:
-                found_match = True
-                break
-        if not found_match:
+        found = [k for k, clause_lit in enumerate(clause) if compatible(other_lit, clause_lit)]
+        if not found:
             return False
-    return True
+        candidates.append(found)
+
+    # поиск с возвратом общей подстановки для всех литералов
+    def search(n, substitution, used):
+        if n == len(other_clause):
+            return True
+        for k in candidates[n]:
+            if k in used:
+                continue
+            extended = match_literal(other_clause[n], clause[k], dict(substitution))
+            if extended is not None and search(n + 1, extended, used | {k}):
+                return True
+        return False
+
+    return search(0, {}, frozenset())
+
+
+def clause_features(clause):
+    # признаки клаузы для индекса вычеркивания:
+    # [длина, число основных литералов, глубина термов], {(предикат, арность, знак): число литералов}
+    ground = 0
+    depth = 0
+    counts = {}
+    for lit in clause:
+        key = literal_key(lit)
+        counts[key] = counts.get(key, 0) + 1
+        if key is None:
+            continue
+        is_ground = True
+        stack = [(arg, 1) for arg in literal_args(lit)]
+        while stack:
+            term, level = stack.pop()
+            depth = max(depth, level)
+            if is_variable(term):
+                is_ground = False
+            stack.extend((arg, level + 1) for arg in term_symbol(term)[1])
+        ground += is_ground
+    return [len(clause), ground, depth], counts
+
+
+def feature_vector(fv_index, clause):
+    # вектор признаков без нулей в конце; предикаты - в порядке регистрации в индексе
+    symbols = fv_index['symbols']
+    vector, counts = clause_features(clause)
+    vector = vector + [0] * len(symbols)
+    for key, count in counts.items():
+        if key not in symbols:
+            symbols[key] = len(symbols)
+            vector.append(0)
+        vector[3 + symbols[key]] = count
+    while vector and vector[-1] == 0:
+        vector.pop()
+    return vector
+
+
+def fv_add(fv_index, clause):
+    # добавление клаузы в индекс векторов признаков (префиксное дерево)
+    node = fv_index['trie']
+    for value in feature_vector(fv_index, clause):
+        node = node.setdefault(value, {})
+    node.setdefault(None, []).append(clause)
+
+
+def fv_remove(fv_index, clause):
+    # удаление клаузы из индекса векторов признаков; опустевшие узлы удаляются,
+    # чтобы поиск кандидатов не обходил пустые ветви
+    node = fv_index['trie']
+    path = []
+    for value in feature_vector(fv_index, clause):
+        path.append((node, value))
+        node = node.get(value)
+        if node is None:
+            return
+    if None not in node:
+        return
+    node[None] = [c for c in node[None] if c is not clause]
+    if not node[None]:
+        del node[None]
+    while path and not node:
+        node, value = path.pop()
+        del node[value]
 
 
-def remove_subsumed_clauses(clauses):
-    # удаляет все наддизъюнкты из множества клауз
+def fv_generalizations(fv_index, clause):
+    # клаузы, вектор признаков которых <= вектора clause (кандидаты в поддизъюнкты)
+    symbols = fv_index['symbols']
+    vector, counts = clause_features(clause)
+    vector = vector + [0] * len(symbols)
+    for key, count in counts.items():
+        if key in symbols:
+            vector[3 + symbols[key]] = count
+    found = []
+    stack = [(fv_index['trie'], 0)]
+    while stack:
+        node, level = stack.pop()
+        for value, child in node.items():
+            if value is None:
+                found.extend(child)
+            elif value <= vector[level]:
+                stack.append((child, level + 1))
+    return found
+
+
+def fv_instances(fv_index, clause):
+    # клаузы, вектор признаков которых >= вектора clause (кандидаты в наддизъюнкты)
+    symbols = fv_index['symbols']
+    vector, counts = clause_features(clause)
+    vector = vector + [0] * len(symbols)
+    for key, count in counts.items():
+        # незарегистрированного предиката нет ни в одной клаузе индекса
+        if key not in symbols:
+            return []
+        vector[3 + symbols[key]] = count
+    while vector and vector[-1] == 0:
+        vector.pop()
+    found = []
+    stack = [(fv_index['trie'], 0)]
+    while stack:
+        node, level = stack.pop()
+        for value, child in node.items():
+            if value is None:
+                # дальше у клауз индекса нули
+                if level >= len(vector):
+                    found.extend(child)
+            elif level >= len(vector) or value >= vector[level]:
+                stack.append((child, level + 1))
+    return found
+
+
+def remove_subsumed_clauses(clauses, deadline=None):
+    # удаляет все наддизъюнкты из множества клауз, порядок оставшихся сохраняется
+    # после deadline непроверенные клаузы остаются
     # стратегия вычеркивания - 5.8
-    if not clauses:
-        return clauses
-
-    # сортировка по длине
-    # более короткие клаузы с большей вероятностью будут поддизъюнктами
-    sorted_clauses = sorted(clauses, key=len)
-    result = []
-
-    # является ли clause наддизъюнктом какой-либо клаузы
-    for i, clause in enumerate(sorted_clauses):
-        is_subsumed = False
-        for other in result:
-            if is_subsumed_by(clause, other):
-                is_subsumed = True
-                break
-        if not is_subsumed:
-            result.append(clause)
-    return result
+    # более короткие клаузы с большей вероятностью будут поддизъюнктами:
+    # проверка по возрастанию длины; оставленная клауза индексируется по одному
+    # (самому конкретному) литералу - он должен перейти в какой-то литерал наддизъюнкта
+    index = {}
+    unindexed = []  # клаузы без индексируемых литералов (в том числе пустая)
+    kept = set()
+    ordered = sorted(clauses, key=len)
+    for k, clause in enumerate(ordered):
+        if deadline_passed(deadline):
+            kept.update(id(clause) for clause in ordered[k:])
+            break
+        candidates = {id(other): other for other in unindexed}
+        for lit in clause:
+            key = literal_key(lit)
+            if key is not None and key in index:
+                for other, _ in index_unifiable(index[key], literal_args(lit)):
+                    candidates[id(other)] = other
+        if any(is_subsumed_by(clause, other) for other in candidates.values()):
+            continue
+        keyed = [i for i, lit in enumerate(clause) if literal_key(lit) is not None]
+        if keyed:
+            index_add_literal(index, clause, max(keyed, key=lambda i: sum(
+                symbol != '*' for symbol in term_path(literal_args(clause[i])))))
+        else:
+            unindexed.append(clause)
+        kept.add(id(clause))
+    return [clause for clause in clauses if id(clause) in kept]
 
 
 def is_tautology(clause):
@@ -169,6 +610,9 @@ def is_tautology(clause):
         for j, lit2 in enumerate(clause):
             if i >= j:
                 continue
+            # отсев по ключам и символам аргументов до унификации
+            if not complementary(lit1, lit2):
+                continue
             # пары предикат - предикат с отрицанием
             if is_predicate(lit1) and lit2[0] == 'not' and is_predicate(lit2[1]):
                 substitution = unify(lit1, lit2[1], {})
@@ -181,6 +625,13 @@ def is_tautology(clause):
     return False
 
 
+def term_to_str(term):
+    # терм в строку: функциональный терм - имя(аргументы)
+    if is_function(term):
+        return f"{term[0]}({', '.join(term_to_str(arg) for arg in term[1:])})"
+    return str(term)
+
+
 def clause_to_str(clause):
     # клауза в строку
     if not clause:
@@ -191,11 +642,11 @@ def clause_to_str(clause):
             literals.append(lit)
         elif lit[0] == 'not':
             if isinstance(lit[1], tuple) and len(lit[1]) == 2 and isinstance(lit[1][1], tuple):
-                literals.append(f"¬{lit[1][0]}{{{', '.join(lit[1][1])}}}")
+                literals.append(f"¬{lit[1][0]}{{{', '.join(map(term_to_str, lit[1][1]))}}}")
             else:
                 literals.append(f"¬{lit[1]}")
         elif isinstance(lit, tuple) and len(lit) == 2 and isinstance(lit[1], tuple):
-            literals.append(f"{lit[0]}{{{', '.join(lit[1])}}}")
+            literals.append(f"{lit[0]}{{{', '.join(map(term_to_str, lit[1]))}}}")
         else:
             literals.append(str(lit))
     return " ∨ ".join(literals)
@@ -207,17 +658,10 @@ def substitution_to_str(substitution):
         return "{}"
     items = []
     for var, value in substitution.items():
-        items.append(f"{var}/{value}")
+        items.append(f"{var}/{term_to_str(value)}")
     return "{" + ", ".join(items) + "}"
 
 
-def find_clause_name(clause, clause_dict):
-    # возвращает имя резольвенты
-    for name, cl in clause_dict.items():
-        if cl == clause:
-            return name
-    return "Unknown"
-
 def has_constants(clause):
     # содержит ли клауза константы
     for lit in clause:
@@ -229,190 +673,934 @@ def has_constants(clause):
     return False
 
 
-def prove(clauses):
-    # основная функция
-    # полученные резольвенты
-    print("Начальные резольвенты:")
-    clause_dict = {}
-    for i, clause in enumerate(clauses, 1):
-        clause_name = f"C{i}"
-        clause_dict[clause_name] = clause
-        print(f"{clause_name}: {clause_to_str(clause)}")
-
-    # настройка для восстановления (для поиска полезных шагов)
+def clause_priority(clause):
+    # приоритет клаузы в очереди (вычисляется один раз при добавлении)
+    # сначала короткие, затем без констант
+    return (len(clause), has_constants(clause))
+
+
+def unit_priority(clause):
+    # предпочтение единичных клауз, остальные - в порядке получения
+    return (len(clause) > 1,)
+
+
+def breadth_priority(clause):
+    # поиск в ширину: клаузы в порядке получения (по номеру)
+    return ()
+
+
+# стратегии поиска: (приоритет клаузы, начальная очередь)
+# "goal" - в очереди только последняя клауза (отрицание цели), остальные активны:
+# резольвенты только от нее и ее потомков (множество поддержки)
+# "all" - в очереди все начальные клаузы (полное насыщение)
+STRATEGIES = {
+    "shortest": (clause_priority, "goal"),
+    "unit": (unit_priority, "all"),
+    "support": (breadth_priority, "goal"),
+    "breadth": (breadth_priority, "all"),
+}
+
+
+@dataclass(eq=False)
+class Clause:
+    # клауза с собственным номером (имя C{номер}), номерами родителей и подстановкой
+    # ведет себя как список литералов
+    id: int
+    literals: list
+    parents: tuple = ()
+    substitution: dict = None
+    priority: tuple = None
+
+    def __post_init__(self):
+        if self.priority is None:
+            self.priority = clause_priority(self.literals)
+
+    @property
+    def name(self):
+        return f"C{self.id}"
+
+    def __iter__(self):
+        return iter(self.literals)
+
+    def __len__(self):
+        return len(self.literals)
+
+    def __getitem__(self, i):
+        return self.literals[i]
+
+
+# статусы результата доказательства
+PROVED = "proved"  # найдена пустая клауза
+SATURATED = "saturated"  # очередь исчерпана, новых резольвент нет
+LIMIT_REACHED = "limit reached"  # превышен лимит (причина - ProofResult.reason)
+
+# приблизительный объем сохраненного литерала вместе с индексами, байт
+LITERAL_MEMORY = 1024
+# предел числа клауз единичной резолюции до основного цикла - на литерал начальных клауз
+UNIT_LIMIT = 4
+# время и память проверяются раз в столько резольвент
+BUDGET_CHECK_INTERVAL = 64
+# предел пар клауз при попытке исключить предикат резолюцией
+ELIMINATION_PAIRS = 256
+
+
+@dataclass
+class Budget:
+    # ограничения поиска, None - без ограничения
+    # причина остановки - имя поля превышенного ограничения
+    time: float = None  # секунды от начала поиска
+    kept: int = 1000  # сохраненных резольвент (шагов)
+    generated: int = None  # полученных резольвент
+    memory: int = None  # байт, оценка по числу сохраненных литералов
+
+
+def budget_exceeded(budget, statistics, started, full=True):
+    # имя превышенного ограничения или None
+    # счетчики сравниваются всегда, время и память - только при full
+    if budget.kept is not None and statistics["kept"] > budget.kept:
+        return "kept"
+    if budget.generated is not None and statistics["generated"] > budget.generated:
+        return "generated"
+    if not full:
+        return None
+    if budget.time is not None and time.perf_counter() - started > budget.time:
+        return "time"
+    if budget.memory is not None and statistics["literals"] * LITERAL_MEMORY > budget.memory:
+        return "memory"
+    return None
+
+
+def deadline_passed(deadline):
+    # наступил ли срок deadline (по perf_counter), None - без срока
+    return deadline is not None and time.perf_counter() > deadline
+
+
+@dataclass
+class ProofResult:
+    # результат доказательства
+    # proof - клаузы доказательства (DAG по номерам родителей), последняя - □
+    # steps - все шаги (номер новой клаузы или None для □, номера родителей, подстановка)
+    # clauses - все клаузы поиска по номеру
+    # reason - превышенное ограничение Budget при LIMIT_REACHED
+    status: str
+    proof: list = field(default_factory=list)
+    steps: list = field(default_factory=list)
+    clauses: dict = field(default_factory=dict)
+    statistics: dict = field(default_factory=dict)
+    reason: str = None
+    # проходы предобработки: (имя, номера удаленных клауз, номера новых клауз)
+    preprocessing: list = field(default_factory=list)
+
+    @property
+    def proved(self):
+        return self.status == PROVED
+
+
+def get_step_word(count):
+    # склонение слова "шаг"
+    if count % 10 == 1 and count % 100 != 11:
+        return "шаг"
+    elif count % 10 in [2, 3, 4] and count % 100 not in [12, 13, 14]:
+        return "шага"
+    else:
+        return "шагов"
+
+
+def step_to_str(number, step, clause_by_id):
+    # шаг в строку (формируется только при выводе)
+    # шаг - (номер новой клаузы или None для □, номер родителя 1, номер родителя 2, подстановка)
+    new_id, parent1, parent2, substitution = step
+    resolution = f"Резолюция C{parent1} и C{parent2}"
+    if substitution:
+        resolution += f" (унификация: {substitution_to_str(substitution)})"
+    if new_id is None:
+        return f"Шаг {number}: {resolution} -> □"
+    return f"Шаг {number} - C{new_id}: {resolution} -> C{new_id}: {clause_to_str(clause_by_id[new_id])}"
+
+
+def unit_resolution(clauses, next_clause_num, priority=clause_priority, deadline=None):
+    # быстрый путь до основного цикла: резолюция единичных клауз с остальными по индексу
+    # - удаление литерала, дополнение которого - частный случай единичной клаузы (unit deletion):
+    #   упрощенная клауза встает на место исходной;
+    # - иначе резольвента с единичной клаузой - лемма (короче родителя);
+    # - две противоположные единичные клаузы - пустая клауза
+    # без пустой клаузы леммы отбрасываются: основной цикл получает только упрощенные клаузы
+    # неединичная клауза ищет партнеров только в индексе единичных клауз;
+    # deadline - время (perf_counter), после которого упрощение прерывается
+    # возвращает (клаузы, новые клаузы в порядке получения, номер следующей клаузы),
+    # при доказательстве пустая клауза - последняя из новых
+    clauses = list(clauses)
+    index = {}  # все текущие клаузы и леммы
+    units = {}  # только единичные клаузы
+    position = {}  # номер клаузы -> позиция в clauses (только текущие клаузы)
+    lemmas = set()  # номера лемм
+    for k, clause in enumerate(clauses):
+        index_add(index, clause)
+        if len(clause) == 1:
+            index_add(units, clause)
+        position[clause.id] = k
+    keys = {variant_key(clause) for clause in clauses}
+    derived = []
+    limit = UNIT_LIMIT * sum(len(clause) for clause in clauses)
+
+    def add(literals, parents, substitution):
+        nonlocal next_clause_num
+        new_clause = Clause(next_clause_num, literals, parents, substitution, priority(literals))
+        next_clause_num += 1
+        derived.append(new_clause)
+        index_add(index, new_clause)
+        if len(new_clause) == 1:
+            index_add(units, new_clause)
+        keys.add(variant_key(new_clause))
+        queue.append(new_clause)
+        return new_clause
+
+    # очередь: каждая новая клауза проверяется снова, новые единичные упрощают старые клаузы
+    queue = deque(clauses)
+    while queue and len(derived) < limit and not deadline_passed(deadline):
+        clause = queue.popleft()
+        if clause.id not in position and clause.id not in lemmas:
+            continue
+        # партнеры единичной клаузы - все клаузы, неединичной - только единичные
+        for other, pairs in find_partners(index if len(clause) == 1 else units, clause).values():
+            if clause.id not in position and clause.id not in lemmas:
+                break
+            if other.id not in position and other.id not in lemmas:
+                continue
+            if len(clause) == 1 and len(other) == 1:
+                # конфликт
+                for resolvent, substitution in resolve_clauses(clause, other, pairs):
+                    derived.append(Clause(next_clause_num, resolvent, (clause.id, other.id), substitution))
+                    return clauses, derived, next_clause_num + 1
+                continue
+            # unit - единичная клауза, target - упрощаемая, j - литералы target в парах
+            if len(clause) == 1:
+                unit, target, positions = clause, other, [j for _, j in pairs]
+            else:
+                unit, target, positions = other, clause, [i for i, _ in pairs]
+            for j in positions:
+                substitution = match_complement(unit[0], target[j])
+                if substitution is not None and unit.id in position and target.id in position:
+                    literals = [lit for k, lit in enumerate(target) if k != j]
+                    new_clause = add(literals, (target.id, unit.id), substitution)
+                    k = position.pop(target.id)
+                    clauses[k] = new_clause
+                    position[new_clause.id] = k
+                    index_remove(index, target)
+                    break
+                for resolvent, substitution in resolve_clauses(target, unit, [(j, 0)]):
+                    if is_tautology(resolvent) or variant_key(resolvent) in keys:
+                        continue
+                    lemmas.add(add(resolvent, (target.id, unit.id), substitution).id)
+    # без доказательства остаются только упрощения начальных клауз
+    derived = [clause for clause in derived if clause.id not in lemmas]
+    return clauses, derived, next_clause_num
+
+
+def is_ground(clause):
+    # клауза без переменных
+    for lit in clause:
+        if literal_key(lit) is None or '*' in term_path(literal_args(lit)):
+            return False
+    return True
+
+
+def ground_refutation(clauses, next_clause_num, statistics, deadline=None, max_learned=None):
+    # основные клаузы - CDCL-решатель (sat.py): атом - переменная решателя
+    # опровержение восстанавливается из цепочек резолюций решателя
+    # max_learned - предел литералов выученных клауз (бюджет памяти)
+    # возвращает (выполнимость: True/False, None - остановка; причина остановки ("time", "memory");
+    # клаузы опровержения по одной, пустая - последняя)
+    solver = Solver()
+    variables = {}  # номер атома -> переменная решателя
+
+    def variable(lit):
+        name, arity, positive = literal_key(lit)
+        atom = lit if positive else lit[1]
+        var = variables.setdefault(term_id(atom), len(variables) + 1)
+        return var if positive else -var
+
+    for clause in clauses:
+        solver.add_clause([variable(lit) for lit in clause])
+    satisfiable = solver.solve(deadline, max_learned)
+    statistics["conflicts"] = solver.conflicts
+    if satisfiable is not False:
+        return satisfiable, solver.stopped, iter(())
+
+    # выученные клаузы, нужные для пустой (цепочки ссылаются только на более ранние клаузы)
+    needed = set()
+    stack = [solver.empty]
+    while stack:
+        chain = stack.pop()
+        for index in [chain[0]] + [index for _, index in chain[1:]]:
+            if index in solver.chains and index not in needed:
+                needed.add(index)
+                stack.append(solver.chains[index])
+
+    by_index = dict(enumerate(clauses))  # номер клаузы решателя -> Clause
+
+    def replay():
+        # цепочки резолюций решателя -> резольвенты по одной (потребитель может остановиться)
+        number = next_clause_num
+        for index in sorted(needed) + [None]:
+            chain = solver.empty if index is None else solver.chains[index]
+            current = by_index[chain[0]]
+            for var, other_index in chain[1:]:
+                other = by_index[other_index]
+                i = next(k for k, lit in enumerate(current) if abs(variable(lit)) == var)
+                j = next(k for k, lit in enumerate(other) if abs(variable(lit)) == var)
+                resolvent, substitution = resolve_clauses(current, other, [(i, j)])[0]
+                current = Clause(number, resolvent, (current.id, other.id), substitution)
+                number += 1
+                yield current
+            if index is not None:
+                by_index[index] = current
+
+    return False, None, replay()
+
+
+# ========== ПРЕДОБРАБОТКА ==========
+# проход - функция (клаузы, derive, deadline) -> оставшиеся клаузы;
+# derive(литералы, номера родителей, подстановка) - новая клауза с номером и шагом вывода;
+# после deadline (perf_counter, None - без срока) проход прерывается, уже сделанные изменения остаются
+
+def clause_variables(clause):
+    # переменные клаузы
+    found = set()
+    stack = [arg for lit in clause if literal_key(lit) is not None for arg in literal_args(lit)]
+    while stack:
+        term = stack.pop()
+        if is_variable(term):
+            found.add(term)
+        else:
+            stack.extend(term_symbol(term)[1])
+    return found
+
+
+def rename_apart(clause, other):
+    # клауза, переменные которой не встречаются в other: общие переименовываются в свободные буквы
+    # (однобуквенная переменная - переменная в обоих пруверах); None - не хватило букв
+    variables = clause_variables(clause)
+    used = variables | clause_variables(other)
+    if not variables & clause_variables(other) and clause is not other:
+        return clause
+    letters = [letter for letter in "abcdefghijklmnopqrstuvwxyz" if letter not in used]
+    if len(letters) < len(variables):
+        return None
+    renaming = dict(zip(sorted(variables), letters))
+    return [intern_term(apply_substitution(lit, renaming)) for lit in clause]
+
+
+def resolve_apart(clause, i, other, j):
+    # резольвенты по литералам i и j, переменные other переименованы (независимые клаузы)
+    renamed = rename_apart(other, clause)
+    if renamed is None:
+        return None
+    return resolve_clauses(clause, renamed, [(i, j)])
+
+
+def is_valid(clause):
+    # есть литерал и его отрицание (совпадают без унификации) - клауза истинна всегда
+    positive = {term_id(lit) for lit in clause if lit[0] != 'not'}
+    return any(lit[0] == 'not' and term_id(lit[1]) in positive for lit in clause)
+
+
+def eliminate_tautologies(clauses, derive, deadline=None):
+    return [clause for clause in clauses if not is_tautology(clause)]
+
+
+def eliminate_subsumed(clauses, derive, deadline=None):
+    return remove_subsumed_clauses(clauses, deadline)
+
+
+def propagate_units(clauses, derive, deadline=None):
+    # единичные клаузы (очередь до неподвижной точки):
+    # клауза с частным случаем единичного литерала удаляется (поглощение),
+    # литерал, дополнение которого - частный случай единичного, вычеркивается
+    # (новая клауза встает на место исходной); при пустой клаузе проход прерывается
+    clauses = list(clauses)
+    position = {clause.id: k for k, clause in enumerate(clauses)}  # номер текущей клаузы -> позиция
+    units = {}  # индекс литералов единичных клауз
+    occurrences = {}  # (имя, арность) -> номера клауз с таким предикатом
+    queue = deque()
+
+    def add(clause):
+        for lit in clause:
+            key = literal_key(lit)
+            if key is not None:
+                occurrences.setdefault(key[:2], set()).add(clause.id)
+        if len(clause) == 1 and literal_key(clause[0]) is not None:
+            # новая единичная клауза - проверка клауз с тем же предикатом
+            index_add(units, clause)
+            queue.extend(occurrences[literal_key(clause[0])[:2]])
+        queue.append(clause.id)
+
+    def unit_candidates(lit, positive):
+        # единичные клаузы с литералом того же (positive) или противоположного знака
+        name, arity, sign = literal_key(lit)
+        tree = units.get((name, arity, sign == positive))
+        return [unit for unit, _ in index_unifiable(tree, literal_args(lit))] if tree else []
+
+    for clause in clauses:
+        add(clause)
+    while queue and not deadline_passed(deadline):
+        k = position.get(queue.popleft())
+        if k is None:
+            continue
+        clause = clauses[k]
+        keyed = [lit for lit in clause if literal_key(lit) is not None]
+        if len(clause) > 1 and any(match_literal(unit[0], lit, {}) is not None
+                                   for lit in keyed for unit in unit_candidates(lit, True)):
+            del position[clause.id]
+            clauses[k] = None
+            continue
+        original = clause
+        m = 0
+        while m < len(clause):
+            lit = clause[m]
+            found = None
+            for unit in unit_candidates(lit, False) if literal_key(lit) is not None else ():
+                substitution = match_complement(unit[0], lit)
+                if substitution is not None:
+                    found = unit, substitution
+                    break
+            if found is None:
+                m += 1
+                continue
+            unit, substitution = found
+            clause = derive([other for n, other in enumerate(clause) if n != m], (clause.id, unit.id), substitution)
+        if clause is original:
+            continue
+        del position[original.id]
+        position[clause.id] = k
+        clauses[k] = clause
+        if not clause:
+            break
+        add(clause)
+    return [clause for clause in clauses if clause is not None]
+
+
+def eliminate_clauses(clauses, removable, deadline=None):
+    # удаление клауз, для которых removable(индекс оставшихся клауз, клауза);
+    # удаление меняет ответ только для клауз с литералом, противоположным литералу удаленной, -
+    # они проверяются снова (раунды до неподвижной точки)
+    index = {}
+    occurrences = {}  # ключ литерала -> клаузы с таким литералом
+    for clause in clauses:
+        index_add(index, clause)
+        for lit in clause:
+            key = literal_key(lit)
+            if key is not None:
+                occurrences.setdefault(key, []).append(clause)
+    removed = set()
+    pending = list(clauses)
+    while pending and not deadline_passed(deadline):
+        dirty = set()
+        for clause in pending:
+            if deadline_passed(deadline):
+                break
+            if id(clause) in removed or not removable(index, clause):
+                continue
+            removed.add(id(clause))
+            index_remove(index, clause)
+            dirty.update((name, arity, not positive)
+                         for name, arity, positive in filter(None, map(literal_key, clause)))
+        pending = list({id(other): other for key in dirty for other in occurrences.get(key, ())
+                        if id(other) not in removed}.values())
+    return [clause for clause in clauses if id(clause) not in removed]
+
+
+def has_pure_literal(index, clause):
+    # есть ли литерал, которому по индексу ни один литерал не может быть противоположным
+    return not all(has_partner(index, lit) for lit in clause if literal_key(lit) is not None)
+
+
+def eliminate_pure_literals(clauses, derive, deadline=None):
+    # клауза с чистым литералом не участвует в опровержении
+    return eliminate_clauses(clauses, has_pure_literal, deadline)
+
+
+def eliminate_predicates(clauses, derive, deadline=None):
+    # исключение предиката резолюцией (Дэвис - Патнэм): клаузы с предикатом заменяются
+    # всеми резольвентами по нему (без тавтологий), если резольвент не больше, чем клауз;
+    # только предикаты, которые входят в каждую клаузу не больше одного раза,
+    # и без резольвент с повторным литералом (основной цикл не делает склейку с унификацией)
+    occurrences = {}  # (имя, арность) -> {id(клауза): [(клауза, позиция литерала, знак)]}
+    counts = {}  # (имя, арность) -> [положительных, отрицательных, клауз с повтором]
+
+    def add(clause):
+        found = {}
+        for i, lit in enumerate(clause):
+            key = literal_key(lit)
+            if key is not None:
+                found.setdefault(key[:2], []).append((clause, i, key[2]))
+        for predicate, entries in found.items():
+            occurrences.setdefault(predicate, {})[id(clause)] = entries
+            count = counts.setdefault(predicate, [0, 0, 0])
+            for _, _, sign in entries:
+                count[0 if sign else 1] += 1
+            count[2] += len(entries) > 1
+
+    def remove(clause):
+        for predicate in {literal_key(lit)[:2] for lit in clause if literal_key(lit) is not None}:
+            entries = occurrences[predicate].pop(id(clause))
+            count = counts[predicate]
+            for _, _, sign in entries:
+                count[0 if sign else 1] -= 1
+            count[2] -= len(entries) > 1
+
+    clauses = {id(clause): clause for clause in clauses}
+    for clause in clauses.values():
+        add(clause)
+    tried = set()
+    while not deadline_passed(deadline):
+        candidates = [(positive * negative, predicate) for predicate, (positive, negative, repeated) in counts.items()
+                      if predicate not in tried and not repeated and positive and negative
+                      and positive * negative <= ELIMINATION_PAIRS]
+        if not candidates:
+            return list(clauses.values())
+        _, predicate = min(candidates)
+        tried.add(predicate)
+        entries = [entry for found in occurrences[predicate].values() for entry in found]
+        positive = [(clause, i) for clause, i, sign in entries if sign]
+        negative = [(clause, i) for clause, i, sign in entries if not sign]
+
+        limit = len(positive) + len(negative)
+        resolvents = []
+        for clause, i in positive:
+            for other, j in negative:
+                found = resolve_apart(clause, i, other, j)
+                if found is None:
+                    resolvents = None
+                    break
+                for literals, substitution in found:
+                    keys = [literal_key(lit) for lit in literals]
+                    if len(set(keys)) < len(keys):
+                        resolvents = None
+                        break
+                    if not is_valid(literals):
+                        resolvents.append((literals, (clause.id, other.id), substitution))
+                if resolvents is None or len(resolvents) > limit:
+                    break
+            if resolvents is None or len(resolvents) > limit:
+                break
+        if resolvents is None or len(resolvents) > limit:
+            continue
+        for clause, _ in positive + negative:
+            remove(clauses.pop(id(clause)))
+        for literals, parents, substitution in resolvents:
+            clause = derive(literals, parents, substitution)
+            clauses[id(clause)] = clause
+            add(clause)
+            if not clause:
+                return list(clauses.values())
+    return list(clauses.values())
+
+
+def is_blocking(index, clause, i):
+    # блокирует ли литерал i клаузу: все резольвенты по нему со всеми клаузами
+    # (и с копией самой клаузы) - тавтологии; у партнера - один противоположный литерал
+    key = literal_key(clause[i])
+    if key is None:
+        return False
+    tree = index.get((key[0], key[1], not key[2]))
+    # партнеры по одному: первая нетавтологичная резольвента останавливает поиск
+    seen = set()
+    for other, j in iter_unifiable(tree, literal_args(clause[i])) if tree else ():
+        if id(other) in seen:
+            return False
+        seen.add(id(other))
+        resolvents = resolve_apart(clause, i, other, j)
+        if resolvents is None or not all(is_valid(literals) for literals, _ in resolvents):
+            return False
+    return True
+
+
+def is_blocked(index, clause):
+    # есть ли литерал, блокирующий клаузу
+    return any(is_blocking(index, clause, i) for i in range(len(clause)))
+
+
+def eliminate_blocked_clauses(clauses, derive, deadline=None):
+    # удаление блокированных клауз: выполнимость не меняется
+    return eliminate_clauses(clauses, is_blocked, deadline)
+
+
+# проходы предобработки по имени
+PREPROCESSING = {
+    "tautologies": eliminate_tautologies,
+    "subsumption": eliminate_subsumed,
+    "units": propagate_units,
+    "pure": eliminate_pure_literals,
+    "elimination": eliminate_predicates,
+    "blocked": eliminate_blocked_clauses,
+}
+# проходы по умолчанию (по порядку)
+DEFAULT_PREPROCESSING = ("tautologies", "subsumption", "units", "pure", "elimination", "blocked", "subsumption")
+# названия проходов для вывода
+PREPROCESSING_NAMES = {
+    "tautologies": "тавтологии",
+    "subsumption": "наддизъюнкты",
+    "units": "единичные клаузы",
+    "pure": "чистые литералы",
+    "elimination": "исключение предикатов",
+    "blocked": "блокированные клаузы",
+}
+
+
+def prove_events(clauses, budget=None, strategy="shortest", preprocessing=DEFAULT_PREPROCESSING):
+    # поиск доказательства как поток событий:
+    # ("preprocessing", (проход, номера удаленных клауз, новые клаузы)) для каждого изменившего проход,
+    # ("input", [клаузы после предобработки]), ("clause", новая клауза) для каждой резольвенты,
+    # в конце ("result", ProofResult); потребитель может прервать поиск в любой момент
+    # budget - ограничения поиска (Budget), по умолчанию - лимит шагов
+    # strategy - имя стратегии из STRATEGIES
+    # preprocessing - проходы предобработки: имена из PREPROCESSING или функции (клаузы, derive, deadline)
+    # термы поиска интернируются в его собственной таблице, активной только на время шага поиска:
+    # параллельные поиски (потоки, чередующиеся генераторы) не мешают друг другу,
+    # таблица освобождается вместе с поиском
+    table = InternTable()
+    events = search_events(clauses, budget, strategy, preprocessing)
+    while True:
+        with searching(table):
+            event = next(events, None)
+        if event is None:
+            return
+        yield event
+
+
+def search_events(clauses, budget, strategy, preprocessing):
+    # тело prove_events
+    if budget is None:
+        budget = Budget()
+    priority, support = STRATEGIES[strategy]
+    started = time.perf_counter()
+    statistics = {
+        "input": 0,  # начальные клаузы
+        "removed_input": 0,  # удалено клауз предобработкой
+        "given": 0,  # обработано выбранных клауз
+        "generated": 0,  # получено резольвент
+        "tautologies": 0,
+        "duplicates": 0,  # варианты сохраненных клауз
+        "forward_subsumed": 0,  # резольвенты - наддизъюнкты сохраненных
+        "backward_subsumed": 0,  # сохраненные - наддизъюнкты резольвент
+        "unit_resolvents": 0,  # клауз единичной резолюции до основного цикла
+        "kept": 0,  # сохранено резольвент
+        "conflicts": 0,  # конфликтов CDCL (основные клаузы)
+        "literals": 0,  # литералов в сохраненных клаузах (оценка памяти)
+        "time": 0.0,
+    }
+
+    # интернирование литералов: общие подтермы, сравнение по номерам
+    # повторяющиеся литералы клаузы склеиваются (5.5)
+    # clauses - любой итерируемый объект (список или поток helper.iter_clauses), читается один раз
+    clauses = [list({term_id(lit): lit for lit in map(intern_term, clause)}.values()) for clause in clauses]
+    statistics["input"] = len(clauses)
+    # шаги - компактные записи (номер новой клаузы, номера родителей, подстановка)
     steps = []
-    parent_map = {}
+    # клаузы с собственными номерами: имена, родители и очередь без поиска по спискам
+    # номера - в порядке ввода (как C1..Cn в выводе prove), до предобработки: проходы не перенумеровывают,
+    # последняя введенная клауза остается целью
+    clauses = [Clause(i, clause, priority=priority(clause)) for i, clause in enumerate(clauses, 1)]
+    # все клаузы по номеру, включая удаленные (для восстановления доказательства)
+    clause_by_id = {clause.id: clause for clause in clauses}
+    next_clause_num = len(clauses) + 1  # номер следующей резольвенты
+    # отрицание цели (последняя клауза) и клаузы, выведенные из него - множество поддержки
+    goal = {clauses[-1].id} if clauses else set()
+    report = []
 
-    length = len(clauses)
-    next_clause_num = length + 1  # число следующей резольвенты
-    active_clauses = [clauses[-1]]  # последняя, которую нужно доказать
-    used_pairs = set()  # повторная обработка пар
-    current = clauses[-1]
+    def finish(status, proof=(), reason=None):
+        statistics["time"] = time.perf_counter() - started
+        return "result", ProofResult(status, list(proof), steps, clause_by_id, statistics, reason, report)
 
-    # стратегия вычеркивания - 5.8
-    initial_clauses = [c for c in clauses if not is_tautology(c)]
-    initial_clauses = remove_subsumed_clauses(initial_clauses)
-    # если что-то удалилось, вывод обновленных резольвент
-    if len(initial_clauses) != length:
-        print(f"Удалено тавтологий/наддизъюнктов: {length - len(initial_clauses)}")
-        clauses = initial_clauses
-        for i, clause in enumerate(clauses, 1):
-            clause_name = f"C{i}"
-            clause_dict[clause_name] = clause
-            print(f"{clause_name}: {clause_to_str(clause)}")
-        # обновление параметров
-        length = len(clauses)
-        next_clause_num = length + 1
-        active_clauses = [clauses[-1]]
+    def record(clause):
+        # клауза, полученная вне основного цикла: номер и шаг
+        clause_by_id[clause.id] = clause
+        steps.append((clause.id if clause else None,) + clause.parents + (clause.substitution,))
+        if goal.intersection(clause.parents):
+            goal.add(clause.id)
+
+    def derive(literals, parents, substitution):
+        nonlocal next_clause_num
+        clause = Clause(next_clause_num, literals, parents, substitution, priority(literals))
+        next_clause_num += 1
+        record(clause)
+        return clause
+
+    # срок по бюджету времени: предобработка, единичная резолюция и CDCL прерываются
+    deadline = None if budget.time is None else started + budget.time
+
+    # предобработка (стратегия вычеркивания - 5.8 и упрощения до поиска)
+    for step in preprocessing:
+        if deadline_passed(deadline):
+            break
+        name = step if isinstance(step, str) else step.__name__
+        before = {clause.id for clause in clauses}
+        clauses = (PREPROCESSING[step] if isinstance(step, str) else step)(clauses, derive, deadline)
+        after = {clause.id for clause in clauses}
+        removed = sorted(before - after)
+        added = [clause for clause in clauses if clause.id not in before]
+        report.append((name, removed, [clause.id for clause in added]))
+        statistics["removed_input"] += len(removed)
+        if removed or added:
+            yield "preprocessing", (name, removed, added)
+        for clause in added:
+            if not clause:
+                yield finish(PROVED, proof_clauses(clause, clause_by_id))
+                return
+
+    statistics["literals"] = sum(len(clause) for clause in clauses)
+    yield "input", list(clauses)
+    if deadline_passed(deadline):
+        yield finish(LIMIT_REACHED, reason="time")
+        return
+
+    # основные клаузы (без переменных) - CDCL-решатель вместо резолюции с унификацией
+    if all(clause and is_ground(clause) for clause in clauses):
+        # выученные клаузы решателя - в пределах бюджета памяти
+        max_learned = None
+        if budget.memory is not None:
+            max_learned = max(0, budget.memory // LITERAL_MEMORY - statistics["literals"])
+        satisfiable, reason, refutation = ground_refutation(clauses, next_clause_num, statistics,
+                                                            deadline, max_learned)
+        # шаги опровержения - резольвенты под тем же бюджетом, что и в основном цикле
+        for clause in refutation:
+            statistics["generated"] += 1
+            full = statistics["generated"] % BUDGET_CHECK_INTERVAL == 0
+            reason = budget_exceeded(budget, statistics, started, full)
+            if reason:
+                yield finish(LIMIT_REACHED, reason=reason)
+                return
+            record(clause)
+            if not clause:
+                yield finish(PROVED, proof_clauses(clause, clause_by_id))
+                return
+            statistics["kept"] += 1
+            statistics["literals"] += len(clause)
+            yield "clause", clause
+        if satisfiable:
+            yield finish(SATURATED)
+        else:
+            yield finish(LIMIT_REACHED, reason=reason)
+        return
+
+    # быстрый путь: единичная резолюция и упрощение единичными клаузами
+    clauses, simplified, next_clause_num = unit_resolution(clauses, next_clause_num, priority, deadline)
+    for clause in simplified:
+        record(clause)
+        if not clause:
+            yield finish(PROVED, proof_clauses(clause, clause_by_id))
+            return
+        statistics["unit_resolvents"] += 1
+        statistics["literals"] += len(clause)
+        yield "clause", clause
+
+    # цикл с выбором клаузы (given clause):
+    # активные - уже обработанные клаузы в индексе литералов,
+    # пассивные - куча (приоритет, номер, клауза), начальная очередь - по стратегии
+    # clauses - все сохраненные клаузы по номеру, удаленные наддизъюнкты пропускаются в куче
+    index = {}
+    # индекс векторов признаков для вычеркивания (активные и пассивные клаузы)
+    fv_index = {'symbols': {}, 'trie': {}}
+    active_clauses = {}
+    passive = []
+    queued = [clause for clause in clauses if clause.id in goal] if support == "goal" else clauses
+    # цель удалена предобработкой - в очереди все клаузы
+    queued_ids = {clause.id for clause in queued or clauses}
+    for clause in clauses:
+        if clause.id not in queued_ids:
+            active_clauses[clause.id] = clause
+            index_add(index, clause)
+    for clause in clauses:
+        fv_add(fv_index, clause)
+    for clause in clauses:
+        if clause.id in queued_ids:
+            heapq.heappush(passive, (clause.priority, clause.id, clause))
+    clauses = {clause.id: clause for clause in clauses}
+    # ключи вариантов сохраненных клауз - проверка дубликатов за O(1)
+    clause_keys = {variant_key(clause) for clause in clauses.values()}
 
     # основной цикл
-    while active_clauses:
-        current = active_clauses.pop(0)
-        current_name = find_clause_name(current, clause_dict)
-        other_clauses = sorted(clauses, key=lambda c: (len(c), has_constants(c)))
-
-        # обработка всех пар (без повторного использования)
-        for other in other_clauses:
-            other_name = find_clause_name(other, clause_dict)
-            pair = tuple(sorted([id(current), id(other)]))
-            if pair in used_pairs:
+    while passive:
+        _, _, current = heapq.heappop(passive)
+        # удалена как наддизъюнкт
+        if current.id not in clauses:
+            continue
+        reason = budget_exceeded(budget, statistics, started)
+        if reason:
+            yield finish(LIMIT_REACHED, reason=reason)
+            return
+        statistics["given"] += 1
+        active_clauses[current.id] = current
+        index_add(index, current)
+        # только клаузы с противоположным унифицируемым литералом (по индексу)
+        partners = find_partners(index, current)
+        other_clauses = sorted(partners.values(), key=lambda p: p[0].priority)
+
+        # каждая пара обрабатывается один раз: партнеры - только активные клаузы
+        for other, pairs in other_clauses:
+            # текущая или партнер удалены как наддизъюнкты
+            if current.id not in clauses:
+                break
+            if other.id not in clauses:
                 continue
-            used_pairs.add(pair)
 
             # резолюции
-            resolvents = resolve_clauses(current, other)
+            resolvents = resolve_clauses(current, other, pairs)
             for resolvent, substitution in resolvents:
+                statistics["generated"] += 1
+                full = statistics["generated"] % BUDGET_CHECK_INTERVAL == 0
+                reason = budget_exceeded(budget, statistics, started, full)
+                if reason:
+                    yield finish(LIMIT_REACHED, reason=reason)
+                    return
                 # пропуск тавтологий
                 if is_tautology(resolvent):
+                    statistics["tautologies"] += 1
                     continue
 
                 # найдена пустая резолюция, доказано
                 if not resolvent:
-                    # полезные шаги и все шаги
-                    useful_steps = reconstruct_proof_path(current_name, other_name, parent_map, clause_dict, length)
-                    if substitution:
-                        steps.append(f"Шаг {len(steps) + 1}: Резолюция {current_name} и {other_name} (унификация: {substitution_to_str(substitution)}) -> □")
-                    else:
-                        steps.append(f"Шаг {len(steps) + 1}: Резолюция {current_name} и {other_name} -> □")
-                    # вывод
-                    print("\nПолная последовательность шагов:")
-                    for step in steps:
-                        print(step)
-                    def get_step_word(count):
-                        if count % 10 == 1 and count % 100 != 11:
-                            return "шаг"
-                        elif count % 10 in [2, 3, 4] and count % 100 not in [12, 13, 14]:
-                            return "шага"
-                        else:
-                            return "шагов"
-                    print(f"Формула доказана за {len(steps)} {get_step_word(len(steps))}")
-                    print("\nПолезные резолюции (шаги):")
-                    for step in useful_steps:
-                        print(step)
+                    steps.append((None, current.id, other.id, substitution))
+                    empty = Clause(next_clause_num, [], (current.id, other.id), substitution)
+                    clause_by_id[empty.id] = empty
+                    yield finish(PROVED, proof_clauses(empty, clause_by_id))
                     return
 
+                # вариант сохраненной клаузы (с точностью до переименования переменных)
+                resolvent_key = variant_key(resolvent)
+                if resolvent_key in clause_keys:
+                    statistics["duplicates"] += 1
+                    continue
+
                 # является ли наддизъюнктом существующих клауз
                 is_subsumed = False
-                for existing_clause in clauses:
+                for existing_clause in fv_generalizations(fv_index, resolvent):
                     if is_subsumed_by(resolvent, existing_clause):
                         is_subsumed = True
                         break
+                if is_subsumed:
+                    statistics["forward_subsumed"] += 1
+                    continue
+
+                # все клаузы, которые являются наддизъюнктами новой, удаляются
+                for c in fv_instances(fv_index, resolvent):
+                    if is_subsumed_by(c, resolvent):
+                        statistics["backward_subsumed"] += 1
+                        del clauses[c.id]
+                        clause_keys.discard(variant_key(c))
+                        if active_clauses.pop(c.id, None) is not None:
+                            index_remove(index, c)
+                        fv_remove(fv_index, c)
 
-                # если не наддизъюнкт и не дубликат
-                if not is_subsumed and resolvent not in clauses:
-                    # все клаузы, которые являются наддизъюнктами новой, удаляются
-                    clauses = [c for c in clauses if not is_subsumed_by(c, resolvent)]
-                    # добавление в резольвенты и цикл
-                    clauses.append(resolvent)
-                    active_clauses.append(resolvent)
-                    # добавление в словарь, родителей и обновление параметра
-                    new_name = f"C{next_clause_num}"
-                    clause_dict[new_name] = resolvent
-                    parent_map[new_name] = (current_name, other_name, substitution)
-                    next_clause_num += 1
-                    # вывод
-                    if substitution:
-                        step_desc = f"Шаг {len(steps) + 1} - {new_name}: Резолюция {current_name} и {other_name} (унификация: {substitution_to_str(substitution)}) -> {new_name}: {clause_to_str(resolvent)}"
-                    else:
-                        step_desc = f"Шаг {len(steps) + 1} - {new_name}: Резолюция {current_name} и {other_name} -> {new_name}: {clause_to_str(resolvent)}"
-                    steps.append(step_desc)
-
-                    # лимит
-                    if len(steps) > 1000:
-                        print("Превышен лимит шагов")
-                        return
-    # если не будет резолюций вообще
-    if current == clauses[-1]:
+                # добавление в сохраненные клаузы и в очередь
+                new_clause = Clause(next_clause_num, resolvent, (current.id, other.id), substitution,
+                                    priority(resolvent))
+                next_clause_num += 1
+                statistics["kept"] += 1
+                statistics["literals"] += len(new_clause)
+                clauses[new_clause.id] = new_clause
+                clause_by_id[new_clause.id] = new_clause
+                clause_keys.add(resolvent_key)
+                heapq.heappush(passive, (new_clause.priority, new_clause.id, new_clause))
+                fv_add(fv_index, new_clause)
+                steps.append((new_clause.id, current.id, other.id, substitution))
+                yield "clause", new_clause
+
+                # лимиты
+                reason = budget_exceeded(budget, statistics, started, False)
+                if reason:
+                    yield finish(LIMIT_REACHED, reason=reason)
+                    return
+    # если не будет резолюций вообще (очередь исчерпана)
+    yield finish(SATURATED)
+
+
+def prove(clauses, verbosity=2, budget=None, strategy="shortest", preprocessing=DEFAULT_PREPROCESSING):
+    # основная функция: доказательство с выводом, возвращает ProofResult
+    # verbosity: 0 - без вывода, 1 - начальные клаузы и полезные шаги,
+    # 2 - также полная последовательность шагов
+    # budget - ограничения поиска (Budget), strategy - имя стратегии из STRATEGIES
+    # preprocessing - проходы предобработки (см. prove_events)
+    clauses = list(clauses)
+    # полученные резольвенты
+    if verbosity >= 1:
+        print("Начальные резольвенты:")
+        for i, clause in enumerate(clauses, 1):
+            print(f"C{i}: {clause_to_str(clause)}")
+
+    result = None
+    changed = False
+    for event, payload in prove_events(clauses, budget, strategy, preprocessing):
+        if event == "preprocessing" and verbosity >= 1:
+            name, removed, added = payload
+            changed = True
+            print(f"Предобработка ({PREPROCESSING_NAMES.get(name, name)}): удалено {len(removed)}, "
+                  f"добавлено {len(added)}")
+        # если что-то изменилось, вывод обновленных резольвент
+        elif event == "input" and changed and verbosity >= 1:
+            print("Клаузы после предобработки:")
+            for clause in payload:
+                print(f"{clause.name}: {clause_to_str(clause)}")
+        elif event == "result":
+            result = payload
+
+    if verbosity >= 1 and result.status == PROVED:
+        steps = result.steps
+        if verbosity >= 2:
+            print("\nПолная последовательность шагов:")
+            for number, step in enumerate(steps, 1):
+                print(step_to_str(number, step, result.clauses))
+        print(f"Формула доказана за {len(steps)} {get_step_word(len(steps))}")
+        print("\nПолезные резолюции (шаги):")
+        for step in reconstruct_proof_path(result.proof):
+            print(step)
+    elif verbosity >= 1 and result.status == LIMIT_REACHED:
+        print(LIMIT_MESSAGES[result.reason])
+    elif verbosity >= 1:
         print("\nФормула не доказана: резолюций с доказуемой резольвентой нет")
+    return result
 
-def reconstruct_proof_path(clause1_name, clause2_name, parent_map, clause_dict, length):
-    # путь доказательства от пустой клаузы к начальным клаузам
-
-    def get_all_ancestors(anc_clause_name):
-        # рекурсивно собирает всех предков клаузы
-        ancestors = {anc_clause_name}
-        if anc_clause_name in parent_map:
-            parent_1, parent_2, _ = parent_map[anc_clause_name]
-            ancestors.update(get_all_ancestors(parent_1))
-            ancestors.update(get_all_ancestors(parent_2))
-        return ancestors
-
-    def topological_sort(clause_names):
-        # сортировка клауз по зависимостям
-        visited = set()
-        result = []
-
-        def visit(visit_clause_name):
-            if visit_clause_name in visited:
-                return
-            visited.add(visit_clause_name)
-            # сначала родители (если они есть)
-            if visit_clause_name in parent_map:
-                parent_1, parent_2, _ = parent_map[visit_clause_name]
-                # только производные клаузы (не начальные)
-                if parent_1 in parent_map or not parent_1.startswith('C') or int(parent_1[1:]) > length:
-                    visit(parent_1)
-                if parent_2 in parent_map or not parent_2.startswith('C') or int(parent_2[1:]) > length:
-                    visit(parent_2)
-            result.append(visit_clause_name)
-        for clause in clause_names:
-            visit(clause)
-        return result
-
-    # все клаузы, участвующие в доказательстве
-    all_ancestors = get_all_ancestors(clause1_name).union(get_all_ancestors(clause2_name))
-    # начальные и производные клаузы
-    initial_clauses = []
-    derived_clauses = []
-    for clause_name in all_ancestors:
-        if clause_name.startswith('C') and int(clause_name[1:]) <= length:
-            initial_clauses.append(clause_name)
-        else:
-            derived_clauses.append(clause_name)
 
-    # начальные клаузы по номеру - сортировка
-    initial_clauses.sort(key=lambda x: int(x[1:]))
+# сообщения о превышенных ограничениях
+LIMIT_MESSAGES = {
+    "kept": "Превышен лимит шагов",
+    "generated": "Превышен лимит резольвент",
+    "time": "Превышен лимит времени",
+    "memory": "Превышен лимит памяти",
+}
+
 
-    # производные клаузы - сортировка
-    sorted_derived = topological_sort(derived_clauses)
+def proof_clauses(empty, clause_by_id):
+    # клаузы, участвующие в доказательстве (обход родителей без рекурсии)
+    # номер резольвенты больше номеров ее родителей:
+    # сортировка по номеру - и начальные по порядку, и производные после родителей
+    ancestors = set()
+    stack = [empty.id]
+    while stack:
+        clause_id = stack.pop()
+        if clause_id in ancestors:
+            continue
+        ancestors.add(clause_id)
+        stack.extend(clause_by_id[clause_id].parents)
+    return [clause_by_id[clause_id] for clause_id in sorted(ancestors)]
 
-    # упорядоченный вывод
+
+def reconstruct_proof_path(proof):
+    # путь доказательства от начальных клауз к пустой клаузе (последняя в proof)
     useful_steps = []
-    # все начальные клаузы
-    for clause_name in initial_clauses:
-        useful_steps.append(f"Начальная {clause_name}: {clause_to_str(clause_dict[clause_name])}")
-    # шаги доказательства с нумерацией
     step_number = 1
-    for clause_name in sorted_derived:
-        if clause_name in parent_map:
-            parent1, parent2, substitution = parent_map[clause_name]
-            if substitution:
-                step_desc = f"Шаг {step_number} - {clause_name}: Резолюция {parent1} и {parent2} (унификация: {substitution_to_str(substitution)}) -> {clause_name}: {clause_to_str(clause_dict[clause_name])}"
-            else:
-                step_desc = f"Шаг {step_number} - {clause_name}: Резолюция {parent1} и {parent2} -> {clause_name}: {clause_to_str(clause_dict[clause_name])}"
-            useful_steps.append(step_desc)
+    for clause in proof[:-1]:
+        # начальные клаузы без родителей
+        if not clause.parents:
+            useful_steps.append(f"Начальная {clause.name}: {clause_to_str(clause)}")
+        else:
+            parent1, parent2 = clause.parents
+            step = (clause.id, parent1, parent2, clause.substitution)
+            useful_steps.append(step_to_str(step_number, step, {clause.id: clause}))
             step_number += 1
 
     # финальный шаг
-    useful_steps.append(f"Шаг {step_number}: Резолюция {clause1_name} и {clause2_name} -> □ (пустая клауза)")
+    parent1, parent2 = proof[-1].parents
+    useful_steps.append(f"Шаг {step_number}: Резолюция C{parent1} и C{parent2} -> □ (пустая клауза)")
     return useful_steps
@@ -0,0 +1,298 @@
+# CDCL-решатель для пропозициональных (основных) клауз:
+# два наблюдаемых литерала, обучение клаузами (1-UIP), VSIDS, перезапуски по Луби.
+# Литерал - целое число: переменная v > 0 или ее отрицание -v.
+# Для каждой выученной клаузы хранится цепочка резолюций,
+# по цепочкам восстанавливается опровержение (вывод пустой клаузы).
+import heapq
+import time
+
+RESTART_BASE = 100  # конфликтов в единице последовательности Луби
+ACTIVITY_DECAY = 0.95  # затухание активности переменных (VSIDS)
+ACTIVITY_LIMIT = 1e100  # порог пересчета активностей
+DEADLINE_INTERVAL = 64  # время проверяется раз в столько конфликтов
+REDUCE_BASE = 2000  # конфликтов до первой чистки выученных клауз
+REDUCE_INCREMENT = 300  # рост промежутка между чистками
+
+
+def luby(i):
+    # i-й член последовательности Луби (1, 1, 2, 1, 1, 2, 4, ...), i >= 0
+    size, power = 1, 0
+    while size < i + 1:
+        power += 1
+        size = 2 * size + 1
+    while size - 1 != i:
+        size = (size - 1) // 2
+        power -= 1
+        i = i % size
+    return 2 ** power
+
+
+class Solver:
+    # клаузы добавляются через add_clause, затем solve()
+    # цепочка резолюций: [номер клаузы, (переменная, номер клаузы), ...] -
+    # резолюция первой клаузы со следующими по указанным переменным
+    def __init__(self):
+        self.clauses = []
+        self.chains = {}  # номер выученной клаузы -> цепочка
+        self.learned = {}  # номер наблюдаемой выученной клаузы -> LBD (число уровней)
+        self.empty = None  # цепочка пустой клаузы (при невыполнимости)
+        self.model = None  # переменная -> значение (при выполнимости)
+        self.conflicts = 0
+        self.learned_literals = 0  # литералов во всех выученных клаузах (оценка памяти)
+        self.stopped = None  # причина остановки solve без ответа: "time" или "memory"
+        self.watches = {}  # литерал -> (блокиратор, номер клаузы) клауз, наблюдающих его
+        self.units = []  # номера единичных клауз
+        self.value = {}  # литерал -> значение (назначаются оба знака)
+        self.level = {}  # переменная -> уровень решения
+        self.reason = {}  # переменная -> номер клаузы-причины (None - решение)
+        self.trail = []  # назначенные литералы по порядку
+        self.trail_lim = []  # начало каждого уровня в trail
+        self.head = 0  # следующий литерал trail для распространения
+        self.activity = {}
+        self.increment = 1.0
+        self.order = []  # куча (-активность, переменная), устаревшие записи пропускаются
+        self.phase = {}  # последнее значение переменной
+
+    def add_clause(self, literals):
+        # номер добавленной клаузы
+        literals = list(dict.fromkeys(literals))
+        literal_set = set(literals)
+        index = len(self.clauses)
+        self.clauses.append(literals)
+        for lit in literals:
+            var = abs(lit)
+            if var not in self.activity:
+                self.activity[var] = 0.0
+                heapq.heappush(self.order, (0.0, var))
+        if not literals:
+            self.empty = [index]
+        elif len(literals) == 1:
+            self.units.append(index)
+        elif not any(-lit in literal_set for lit in literals):
+            # тавтологии всегда выполнены и не наблюдаются
+            self.watches.setdefault(literals[0], []).append((literals[1], index))
+            self.watches.setdefault(literals[1], []).append((literals[0], index))
+        return index
+
+    def value_of(self, lit):
+        # True/False или None для неназначенного литерала
+        return self.value.get(lit)
+
+    def assign(self, lit, reason):
+        var = abs(lit)
+        self.value[lit] = True
+        self.value[-lit] = False
+        self.level[var] = len(self.trail_lim)
+        self.reason[var] = reason
+        self.trail.append(lit)
+
+    def propagate(self):
+        # распространение единичных клауз, номер конфликтной клаузы или None
+        value_of = self.value.get
+        while self.head < len(self.trail):
+            false_lit = -self.trail[self.head]
+            self.head += 1
+            watchers = self.watches.get(false_lit, [])
+            kept = 0
+            for k in range(len(watchers)):
+                # запись - (литерал-блокиратор, номер клаузы): истинный блокиратор - клауза выполнена
+                blocker, index = watchers[k]
+                if value_of(blocker) is True:
+                    watchers[kept] = watchers[k]
+                    kept += 1
+                    continue
+                clause = self.clauses[index]
+                # наблюдаемый ложный литерал - на второй позиции
+                if clause[0] == false_lit:
+                    clause[0], clause[1] = clause[1], clause[0]
+                first = clause[0]
+                if value_of(first) is True:
+                    watchers[kept] = (first, index)
+                    kept += 1
+                    continue
+                # новый наблюдаемый литерал
+                for m in range(2, len(clause)):
+                    if value_of(clause[m]) is not False:
+                        clause[1], clause[m] = clause[m], clause[1]
+                        self.watches.setdefault(clause[1], []).append((first, index))
+                        break
+                else:
+                    watchers[kept] = (first, index)
+                    kept += 1
+                    if value_of(first) is False:
+                        watchers[kept:] = watchers[k + 1:]
+                        self.head = len(self.trail)
+                        return index
+                    self.assign(first, index)
+            del watchers[kept:]
+        return None
+
+    def bump(self, var):
+        # повышение активности переменной из конфликта
+        self.activity[var] += self.increment
+        if self.activity[var] > ACTIVITY_LIMIT:
+            for other in self.activity:
+                self.activity[other] /= ACTIVITY_LIMIT
+            self.increment /= ACTIVITY_LIMIT
+            self.order = [(-activity, other) for other, activity in self.activity.items()
+                          if other not in self.value]
+            heapq.heapify(self.order)
+        elif var not in self.value:
+            heapq.heappush(self.order, (-self.activity[var], var))
+
+    def level0_chain(self, variables):
+        # резолюции, убирающие ложные литералы уровня 0 (по причинам, в обратном порядке trail)
+        pending = set(variables)
+        chain = []
+        end = self.trail_lim[0] if self.trail_lim else len(self.trail)
+        for lit in reversed(self.trail[:end]):
+            var = abs(lit)
+            if var in pending:
+                reason = self.reason[var]
+                chain.append((var, reason))
+                pending.update(abs(other) for other in self.clauses[reason] if abs(other) != var)
+        return chain
+
+    def analyze(self, conflict):
+        # выученная клауза (1-UIP), ее цепочка резолюций, уровень возврата и LBD
+        current_level = len(self.trail_lim)
+        seen = set()
+        learned = []  # литералы нижних уровней
+        level0 = []
+        chain = [conflict]
+        clause = self.clauses[conflict]
+        count = 0  # литералы текущего уровня, еще не разрешенные
+        position = len(self.trail) - 1
+        while True:
+            for lit in clause:
+                var = abs(lit)
+                if var in seen:
+                    continue
+                seen.add(var)
+                self.bump(var)
+                if self.level[var] == current_level:
+                    count += 1
+                elif self.level[var] == 0:
+                    level0.append(var)
+                else:
+                    learned.append(lit)
+            while abs(self.trail[position]) not in seen:
+                position -= 1
+            pivot = self.trail[position]
+            position -= 1
+            count -= 1
+            if count == 0:
+                break
+            reason = self.reason[abs(pivot)]
+            chain.append((abs(pivot), reason))
+            clause = self.clauses[reason]
+        chain.extend(self.level0_chain(level0))
+        learned.insert(0, -pivot)
+        # второй наблюдаемый - литерал с наибольшим уровнем
+        back_level = 0
+        if len(learned) > 1:
+            best = max(range(1, len(learned)), key=lambda k: self.level[abs(learned[k])])
+            learned[1], learned[best] = learned[best], learned[1]
+            back_level = self.level[abs(learned[1])]
+        lbd = len({self.level[abs(lit)] for lit in learned})
+        return learned, chain, back_level, lbd
+
+    def reduce(self):
+        # чистка: половина выученных клауз с наибольшим LBD перестает наблюдаться
+        # (клаузы-причины назначений и клаузы с LBD <= 2 остаются; цепочки не меняются)
+        locked = set(self.reason.values())
+        candidates = sorted((lbd, index) for index, lbd in self.learned.items()
+                            if lbd > 2 and index not in locked)
+        removed = {index for _, index in candidates[len(candidates) // 2:]}
+        for index in removed:
+            del self.learned[index]
+        for watchers in self.watches.values():
+            watchers[:] = [watcher for watcher in watchers if watcher[1] not in removed]
+
+    def backtrack(self, level):
+        # отмена назначений выше уровня level
+        if len(self.trail_lim) <= level:
+            return
+        start = self.trail_lim[level]
+        for lit in self.trail[start:]:
+            var = abs(lit)
+            self.phase[var] = lit > 0
+            del self.value[lit], self.value[-lit]
+            del self.level[var]
+            del self.reason[var]
+            heapq.heappush(self.order, (-self.activity[var], var))
+        del self.trail[start:]
+        del self.trail_lim[level:]
+        self.head = start
+
+    def decide(self):
+        # неназначенная переменная с наибольшей активностью или None
+        while self.order:
+            activity, var = heapq.heappop(self.order)
+            if var not in self.value and -activity == self.activity[var]:
+                return var
+        return None
+
+    def solve(self, deadline=None, max_learned=None):
+        # True - выполнимо (self.model), False - невыполнимо (self.empty),
+        # None - истек срок deadline (time.perf_counter()) или выученных литералов
+        # больше max_learned (причина - self.stopped)
+        if self.empty is not None:
+            return False
+        for index in self.units:
+            lit = self.clauses[index][0]
+            value = self.value_of(lit)
+            if value is False:
+                self.empty = [index] + self.level0_chain([abs(lit)])
+                return False
+            if value is None:
+                self.assign(lit, index)
+
+        restarts = 0
+        restart_limit = luby(restarts) * RESTART_BASE
+        since_restart = 0
+        reductions = 0
+        next_reduce = REDUCE_BASE
+        while True:
+            conflict = self.propagate()
+            if conflict is not None:
+                self.conflicts += 1
+                if not self.trail_lim:
+                    variables = [abs(lit) for lit in self.clauses[conflict]]
+                    self.empty = [conflict] + self.level0_chain(variables)
+                    return False
+                learned, chain, back_level, lbd = self.analyze(conflict)
+                self.backtrack(back_level)
+                index = self.add_clause(learned)
+                self.chains[index] = chain
+                if len(learned) > 1:
+                    self.learned[index] = lbd
+                self.assign(learned[0], index)
+                self.increment /= ACTIVITY_DECAY
+                since_restart += 1
+                self.learned_literals += len(learned)
+                if max_learned is not None and self.learned_literals > max_learned:
+                    self.stopped = "memory"
+                    return None
+                if deadline is not None and self.conflicts % DEADLINE_INTERVAL == 0 \
+                        and time.perf_counter() > deadline:
+                    self.stopped = "time"
+                    return None
+                continue
+
+            if self.conflicts >= next_reduce:
+                self.reduce()
+                reductions += 1
+                next_reduce = self.conflicts + REDUCE_BASE + REDUCE_INCREMENT * reductions
+            if since_restart >= restart_limit:
+                self.backtrack(0)
+                restarts += 1
+                restart_limit = luby(restarts) * RESTART_BASE
+                since_restart = 0
+
+            var = self.decide()
+            if var is None:
+                self.model = {var: self.value[var] for var in self.activity}
+                return True
+            self.trail_lim.append(len(self.trail))
+            self.assign(var if self.phase.get(var, False) else -var, None)